@@ -0,0 +1,52 @@
+"""add lookup and join indexes
+
+Tables themselves are created by `python models.py`, this revision only adds
+the indexes used by the name lookups in models.py and the my_select joins.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = (
+    ("ix_students_first_name_last_name", "students", ["first_name", "last_name"]),
+    ("ix_teachers_first_name_last_name", "teachers", ["first_name", "last_name"]),
+    ("ix_groups_code", "groups", ["code"]),
+    ("ix_grades_code", "grades", ["code"]),
+    ("ix_subjects_name", "subjects", ["name"]),
+    ("ix_students_grades_student_subject_grade", "students_grades",
+     ["student_id", "subject_id", "grade_id"]),
+    ("ix_students_grades_subject_student_grade", "students_grades",
+     ["subject_id", "student_id", "grade_id"]),
+    ("ix_students_grades_grade_id", "students_grades", ["grade_id"]),
+    ("ix_teachers_subjects_teacher_subject", "teachers_subjects",
+     ["teacher_id", "subject_id"]),
+    ("ix_teachers_subjects_subject_teacher", "teachers_subjects",
+     ["subject_id", "teacher_id"]),
+    ("ix_students_groups_group_student", "students_groups",
+     ["group_id", "student_id"]),
+    ("ix_students_groups_student_group", "students_groups",
+     ["student_id", "group_id"]),
+)
+
+
+def upgrade() -> None:
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, if_not_exists=True)
+
+
+def downgrade() -> None:
+    for name, table, columns in reversed(INDEXES):
+        op.drop_index(name, table_name=table, if_exists=True)
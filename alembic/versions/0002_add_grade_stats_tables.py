@@ -0,0 +1,63 @@
+"""add grade stats tables
+
+Sum and count of grade values per student, per student and subject, per
+subject and in total. models.py keeps them up to date on every StudentGrade
+insert/delete, `python models.py --rebuild-stats` recalculates them.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+STATS_TABLES = {
+    "students_grades_stats": ["student_id"],
+    "students_subjects_grades_stats": ["student_id", "subject_id"],
+    "subjects_grades_stats": ["subject_id"],
+    "grades_stats": ["id"],
+}
+
+
+def upgrade() -> None:
+    # `python models.py` creates (and fills) the stats tables as well
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+    tables = {
+        table: key_columns for table, key_columns in STATS_TABLES.items()
+        if table not in existing
+    }
+    for table, key_columns in tables.items():
+        op.create_table(
+            table,
+            *(sa.Column(c, sa.Integer(), primary_key=True) for c in key_columns),
+            sa.Column("grades_sum", sa.Integer(), nullable=False),
+            sa.Column("grades_count", sa.Integer(), nullable=False),
+        )
+
+    for table, key_columns in tables.items():
+        if table == "grades_stats":
+            keys, group_by = "1", ""
+        else:
+            keys = ", ".join(f"sg.{c}" for c in key_columns)
+            group_by = f"GROUP BY {keys}"
+        op.execute(
+            f"INSERT INTO {table} ({', '.join(key_columns)}, grades_sum, grades_count) "
+            f"SELECT {keys}, SUM(g.value), COUNT(*) "
+            f"FROM students_grades sg JOIN grades g ON g.id = sg.grade_id "
+            f"{group_by} HAVING COUNT(*) > 0"
+        )
+
+
+def downgrade() -> None:
+    for table in reversed(list(STATS_TABLES)):
+        op.drop_table(table)
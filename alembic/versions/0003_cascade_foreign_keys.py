@@ -0,0 +1,53 @@
+"""cascade foreign keys
+
+Recreates the foreign keys of the link tables with ON DELETE CASCADE, so
+deleting a student, grade, subject, teacher or group removes its rows in
+students_grades, students_groups and teachers_subjects in the DB, without the
+ORM loading them.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+FOREIGN_KEYS = {
+    "students_grades": [
+        ("student_id", "students"), ("grade_id", "grades"), ("subject_id", "subjects"),
+    ],
+    "teachers_subjects": [("teacher_id", "teachers"), ("subject_id", "subjects")],
+    "students_groups": [("student_id", "students"), ("group_id", "groups")],
+}
+# PostgreSQL's default constraint names, also given to the unnamed SQLite ones
+NAMING_CONVENTION = {"fk": "%(table_name)s_%(column_0_name)s_fkey"}
+
+
+def _recreate_foreign_keys(ondelete: str | None) -> None:
+    for table, foreign_keys in FOREIGN_KEYS.items():
+        with op.batch_alter_table(
+                table, naming_convention=NAMING_CONVENTION
+        ) as batch_op:
+            for column, referred_table in foreign_keys:
+                name = f"{table}_{column}_fkey"
+                batch_op.drop_constraint(name, type_="foreignkey")
+                batch_op.create_foreign_key(
+                    name, referred_table, [column], ["id"], ondelete=ondelete
+                )
+
+
+def upgrade() -> None:
+    _recreate_foreign_keys("CASCADE")
+
+
+def downgrade() -> None:
+    _recreate_foreign_keys(None)
@@ -0,0 +1,44 @@
+"""add students_grades.grade_value
+
+Copy of grades.value on every students_grades row, so the reports aggregate
+grades without joining grades. Existing rows are backfilled from grades.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    columns = sa.inspect(op.get_bind()).get_columns("students_grades")
+    if any(column["name"] == "grade_value" for column in columns):
+        # Created by `python models.py` together with the table
+        return
+    op.add_column(
+        "students_grades", sa.Column("grade_value", sa.Integer(), nullable=True)
+    )
+    op.execute(
+        "UPDATE students_grades SET grade_value = "
+        "(SELECT grades.value FROM grades WHERE grades.id = students_grades.grade_id)"
+    )
+    with op.batch_alter_table("students_grades") as batch_op:
+        batch_op.alter_column(
+            "grade_value", existing_type=sa.Integer(), nullable=False
+        )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("students_grades") as batch_op:
+        batch_op.drop_column("grade_value")
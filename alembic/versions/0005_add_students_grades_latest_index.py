@@ -0,0 +1,34 @@
+"""add students_grades (subject_id, student_id, created_at) index
+
+Used by select_2_additional_window to find the latest grade of every student
+in a subject.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_students_grades_subject_student_created", "students_grades",
+        ["subject_id", "student_id", "created_at"], if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_students_grades_subject_student_created", table_name="students_grades",
+        if_exists=True,
+    )
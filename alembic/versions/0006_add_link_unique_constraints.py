@@ -0,0 +1,57 @@
+"""add unique constraints to teachers_subjects and students_groups
+
+Removes the duplicate links the seed wrote (keeping the row with the lowest id
+of every pair), then replaces the (teacher_id, subject_id) and
+(student_id, group_id) indexes with unique constraints on the same columns.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# table: (index replaced by the constraint, constraint, columns)
+UNIQUE_KEYS = {
+    "teachers_subjects": (
+        "ix_teachers_subjects_teacher_subject", "uq_teachers_subjects_teacher_subject",
+        ["teacher_id", "subject_id"],
+    ),
+    "students_groups": (
+        "ix_students_groups_student_group", "uq_students_groups_student_group",
+        ["student_id", "group_id"],
+    ),
+}
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    for table, (index, constraint, columns) in UNIQUE_KEYS.items():
+        if any(unique["name"] == constraint
+               for unique in inspector.get_unique_constraints(table)):
+            # Created by `python models.py` together with the table
+            continue
+        op.execute(sa.text(
+            f"DELETE FROM {table} WHERE id NOT IN "
+            f"(SELECT min(id) FROM {table} GROUP BY {', '.join(columns)})"
+        ))
+        op.drop_index(index, table_name=table, if_exists=True)
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.create_unique_constraint(constraint, columns)
+
+
+def downgrade() -> None:
+    for table, (index, constraint, columns) in UNIQUE_KEYS.items():
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_constraint(constraint, type_="unique")
+        op.create_index(index, table, columns, if_not_exists=True)
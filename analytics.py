@@ -0,0 +1,227 @@
+"""
+In-memory answers to the aggregate my_select reports (select_1 - select_4,
+select_8 and select_1_additional) for batch reporting: students_grades is
+streamed once into NumPy arrays and every report is a few np.bincount calls
+over them instead of its own aggregate query.
+
+    frame = await GradesFrame.load()
+    frame.select_1()
+    frame.select_2(subject_name="MATH")
+
+NumPy is the optional `analytics` extra, install it with
+`poetry install --extras analytics`.
+"""
+from __future__ import annotations
+
+from typing import NamedTuple
+
+from sqlalchemy import select
+
+from db import AsyncReadSession
+from models import (
+    Student, StudentGrade, Subject, Teacher, TeacherSubject
+)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class StudentAvg(NamedTuple):
+    avg_grade: float
+    student_id: int
+    first_name: str
+    last_name: str
+
+
+class SubjectAvg(NamedTuple):
+    avg_grade: float
+    subject_name: str
+
+
+class Avg(NamedTuple):
+    avg_grade: float
+
+
+class TeacherAvg(NamedTuple):
+    avg_grade: float
+    first_name: str
+    last_name: str
+
+
+class TeacherStudentAvg(NamedTuple):
+    avg_grade: float
+    student_first_name: str
+    student_last_name: str
+    teacher_first_name: str
+    teacher_last_name: str
+
+
+def _avg(total: float, count: int) -> float:
+    return round(float(total) / int(count), 2)
+
+
+class GradesFrame:
+    """
+    Columns of students_grades (student_id, subject_id, grade_value,
+    created_at) plus the small dimension tables the reports need for names.
+    """
+
+    def __init__(
+            self, student_id: np.ndarray, subject_id: np.ndarray,
+            grade_value: np.ndarray, created_at: np.ndarray,
+            students: dict[int, tuple[str, str]], subjects: dict[str, int],
+            teachers: dict[int, tuple[str, str]], teachers_subjects: np.ndarray,
+    ):
+        self.student_id = student_id
+        self.subject_id = subject_id
+        self.grade_value = grade_value
+        self.created_at = created_at
+        self.students = students
+        self.subjects = subjects
+        self.teachers = teachers
+        # (teacher_id, subject_id) rows of teachers_subjects
+        self.teachers_subjects = teachers_subjects
+        self.subjects_size = max([*subjects.values(), *teachers_subjects[:, 1], 0]) + 1
+        self.subject_sums = np.bincount(
+            subject_id, weights=grade_value, minlength=self.subjects_size
+        )
+        self.subject_counts = np.bincount(subject_id, minlength=self.subjects_size)
+        self.subjects_size = len(self.subject_counts)
+
+    @classmethod
+    async def load(cls, chunk_size: int = 10000) -> GradesFrame:
+        if np is None:
+            raise Exception("NumPy is required for the analytics reports, "
+                            "install it with `poetry install --extras analytics`")
+        async with AsyncReadSession() as session:
+            columns = ([], [], [], [])
+            result = await session.stream(
+                select(
+                    StudentGrade.student_id, StudentGrade.subject_id,
+                    StudentGrade.grade_value, StudentGrade.created_at,
+                ).execution_options(yield_per=chunk_size)
+            )
+            async for rows in result.partitions():
+                for column, chunk in zip(columns, zip(*rows)):
+                    column.append(chunk)
+
+            students = {
+                row.id: (row.first_name, row.last_name)
+                for row in await session.execute(
+                    select(Student.id, Student.first_name, Student.last_name)
+                )
+            }
+            subjects = dict(
+                (await session.execute(select(Subject.name, Subject.id))).all()
+            )
+            teachers = {
+                row.id: (row.first_name, row.last_name)
+                for row in await session.execute(
+                    select(Teacher.id, Teacher.first_name, Teacher.last_name)
+                )
+            }
+            teachers_subjects = (await session.execute(
+                select(TeacherSubject.teacher_id, TeacherSubject.subject_id)
+            )).all()
+
+        def concat(chunks: list, dtype) -> np.ndarray:
+            if not chunks:
+                return np.array([], dtype=dtype)
+            return np.concatenate([np.array(chunk, dtype=dtype) for chunk in chunks])
+
+        student_id, subject_id, grade_value, created_at = columns
+        return cls(
+            student_id=concat(student_id, np.int64),
+            subject_id=concat(subject_id, np.int64),
+            grade_value=concat(grade_value, np.float64),
+            created_at=concat(created_at, "datetime64[us]"),
+            students=students,
+            subjects=subjects,
+            teachers=teachers,
+            teachers_subjects=np.array(
+                teachers_subjects, dtype=np.int64
+            ).reshape(-1, 2),
+        )
+
+    def _student_avgs(
+            self, mask: np.ndarray = None, limit: int = None
+    ) -> list[StudentAvg]:
+        student_id = self.student_id if mask is None else self.student_id[mask]
+        grade_value = self.grade_value if mask is None else self.grade_value[mask]
+        sums = np.bincount(student_id, weights=grade_value)
+        counts = np.bincount(student_id)
+        ids = np.flatnonzero(counts)
+        avgs = np.round(sums[ids] / counts[ids], 2)
+        order = np.argsort(-avgs, kind="stable")[:limit]
+        return [
+            StudentAvg(float(avgs[i]), int(ids[i]), *self.students[int(ids[i])])
+            for i in order
+        ]
+
+    def select_1(self) -> list[StudentAvg]:
+        # 5 students with the highest average grade over all subjects
+        return self._student_avgs(limit=5)
+
+    def select_2(self, subject_name: str) -> StudentAvg | None:
+        # Student with the highest average grade in the subject
+        if subject_name not in self.subjects:
+            return None
+        rows = self._student_avgs(self.subject_id == self.subjects[subject_name], 1)
+        return rows[0] if rows else None
+
+    def select_3(self, subject_name: str) -> list[SubjectAvg]:
+        # Average grade in the subject
+        subject_id = self.subjects.get(subject_name)
+        if subject_id is None or not self.subject_counts[subject_id]:
+            return []
+        return [SubjectAvg(
+            _avg(self.subject_sums[subject_id], self.subject_counts[subject_id]),
+            subject_name,
+        )]
+
+    def select_4(self) -> Avg | None:
+        # Average over all grades
+        if not len(self.grade_value):
+            return None
+        return Avg(_avg(self.grade_value.sum(), len(self.grade_value)))
+
+    def select_8(self) -> list[TeacherAvg]:
+        # Average grade in the subjects of every teacher (by full name, as in SQL)
+        totals = {}
+        for teacher_id, subject_id in self.teachers_subjects:
+            name = self.teachers[int(teacher_id)]
+            total = totals.setdefault(name, [0.0, 0])
+            total[0] += self.subject_sums[subject_id]
+            total[1] += self.subject_counts[subject_id]
+        return [
+            TeacherAvg(_avg(total, count), *name)
+            for name, (total, count) in totals.items() if count
+        ]
+
+    def select_1_additional(
+            self, teacher_id: int, student_id: int
+    ) -> TeacherStudentAvg | None:
+        # Average grade the teacher gives the student
+        ts = self.teachers_subjects
+        # 1 for the subjects of the teacher, (teacher_id, subject_id) is unique
+        links = np.bincount(ts[ts[:, 0] == teacher_id, 1], minlength=self.subjects_size)
+        mask = self.student_id == student_id
+        sums = np.bincount(
+            self.subject_id[mask], weights=self.grade_value[mask],
+            minlength=self.subjects_size,
+        )
+        counts = np.bincount(self.subject_id[mask], minlength=self.subjects_size)
+        count = int((links * counts).sum())
+        if not count:
+            return None
+        return TeacherStudentAvg(
+            _avg((links * sums).sum(), count),
+            *self.students[student_id], *self.teachers[teacher_id],
+        )
+
+
+ANALYTICS_REPORTS = (
+    "select_1", "select_2", "select_3", "select_4", "select_8", "select_1_additional",
+)
@@ -0,0 +1,375 @@
+"""
+Batch mode of cli.py: runs the operations of a JSON lines file in one process
+over one connection.
+
+    python cli.py --batch ops.jsonl --transaction-size 500 --rejected failed.jsonl
+
+Every line is an object with the cli.py option names as keys:
+
+    {"action": "create", "model": "Teacher", "name": "Ann Lee", "gender": "F"}
+    {"action": "create", "model": "StudentGrade", "name": "Ann Lee", "subject": "MATH", "grade": "A"}
+    {"action": "update", "model": "Grade", "id": 2, "value": 4}
+    {"action": "remove", "model": "Student", "ids": [3, 4]}
+
+Operations are committed in transactions of `--transaction-size`. Names of
+teachers and students used by the batch are resolved with one query each
+(grades, subjects and groups through `dimensions`) before the first
+operation. An operation with missing or unknown values fails alone, a DB error
+rolls back and fails its whole transaction. Creating a teacher subject or a
+student group link that already exists is a no-op.
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import logging
+import time
+from contextlib import redirect_stderr
+from datetime import datetime
+from typing import Any, Iterable
+
+from sqlalchemy import select, tuple_
+from sqlalchemy.exc import DBAPIError
+
+from cache import report_cache
+from cli import option_kinds
+from cli_actions import read_cli_param, read_filters
+from enums import CLI_ACTIONS
+from models import (
+    AsyncDBSession, Base, MODELS, Grade, Group, Student, StudentGrade, StudentGroup,
+    Subject, Teacher, TeacherSubject, cascade_tables, delete_rows_criteria,
+    delete_rows_sync, dimensions, insert_ignore, rebuild_grade_stats_sync,
+    sync_grade_values, update_rows_query,
+)
+
+PEOPLE = (Teacher, Student)
+LINKS = (TeacherSubject, StudentGrade, StudentGroup)
+UPDATE_FIELDS = {
+    Group: ("name", "code"),
+    Grade: ("value", "code"),
+    Subject: ("name", "description"),
+}
+
+
+def full_name(name: str) -> tuple[str, str]:
+    parts = tuple((name or "").split())
+    if len(parts) != 2:
+        raise Exception(f"Name '{name}' should be a first and a last name")
+    return parts
+
+
+def read_birthdate(value: str | None) -> datetime | None:
+    return datetime.strptime(value, "%Y-%m-%d") if value else None
+
+
+class Lookups:
+    """Name -> id of everything the batch refers to, updated as rows are created."""
+
+    def __init__(self):
+        self.teachers: dict[tuple[str, str], int] = {}
+        self.students: dict[tuple[str, str], int] = {}
+        self.grades: dict[str, int] = {}
+        self.subjects: dict[str, int] = {}
+        self.groups: dict[str, int] = {}
+
+    async def load(self, session, ops: Iterable[argparse.Namespace]) -> None:
+        names = {Teacher: set(), Student: set()}
+        dims_keys = {"grades": set(), "subjects": set(), "groups": set()}
+        for op in ops:
+            model = MODELS.get(op.model)
+            for lookup, key in (("grades", op.grade), ("subjects", op.subject),
+                                ("groups", op.group)):
+                if key is not None:
+                    dims_keys[lookup].add(key)
+            if model is TeacherSubject:
+                names[Teacher].add(tuple((op.name or "").split()))
+            elif model in (StudentGrade, StudentGroup):
+                names[Student].add(tuple((op.name or "").split()))
+        for model, lookup in ((Teacher, self.teachers), (Student, self.students)):
+            keys = [name for name in names[model] if len(name) == 2]
+            if not keys:
+                continue
+            rows = await session.execute(
+                select(model.first_name, model.last_name, model.id)
+                .where(tuple_(model.first_name, model.last_name).in_(keys))
+                .order_by(model.id)
+            )
+            for first_name, last_name, _id in rows:
+                lookup.setdefault((first_name, last_name), _id)
+        dims = await dimensions.load(session, **dims_keys)
+        self.grades = dict(dims.grades)
+        self.subjects = dict(dims.subjects)
+        self.groups = dict(dims.groups)
+
+    @staticmethod
+    def get(lookup: dict, key: Any, name: str) -> int:
+        if key not in lookup:
+            raise Exception(f"{name} '{key}' doesn't exist in DB")
+        return lookup[key]
+
+
+class BatchRunner:
+    def __init__(self, session, lookups: Lookups):
+        self.session = session
+        self.lookups = lookups
+        self.tables: set[str] = set()
+        self.changed_grades: set[int] = set()
+
+    async def run(self, op: argparse.Namespace) -> None:
+        model: Base = MODELS.get(read_cli_param("model", op.model, is_required=True))
+        if model is None:
+            raise Exception(f"Unknown model '{op.model}'")
+        if op.action == CLI_ACTIONS.CREATE.value:
+            await self.create(op, model)
+        elif op.action == CLI_ACTIONS.UPDATE.value:
+            await self.update(op, model)
+        elif op.action == CLI_ACTIONS.REMOVE.value:
+            await self.remove(op, model)
+        else:
+            raise Exception(f"Action '{op.action}' isn't supported in a batch")
+
+    async def create(self, op: argparse.Namespace, model: Base) -> None:
+        lookups = self.lookups
+        if model in PEOPLE:
+            first_name, last_name = full_name(read_cli_param("name", op.name, True))
+            row = model(
+                first_name=first_name, last_name=last_name,
+                gender=read_cli_param("gender", op.gender, True),
+                birthdate=read_birthdate(op.birthdate),
+            )
+        elif model is Group:
+            row = Group(name=read_cli_param("name", op.name, True),
+                        code=read_cli_param("code", op.code, True))
+        elif model is Grade:
+            row = Grade(value=int(read_cli_param("value", op.value, True)),
+                        code=read_cli_param("code", op.code, True))
+        elif model is Subject:
+            row = Subject(name=read_cli_param("name", op.name, True),
+                          description=read_cli_param("description", op.description,
+                                                     True))
+        elif model is StudentGrade:
+            row = StudentGrade(
+                student_id=lookups.get(
+                    lookups.students, full_name(op.name), "Student"),
+                subject_id=lookups.get(lookups.subjects, op.subject, "Subject"),
+                grade_id=lookups.get(lookups.grades, op.grade, "Grade"),
+            )
+        else:
+            if model is TeacherSubject:
+                values = {
+                    "teacher_id": lookups.get(
+                        lookups.teachers, full_name(op.name), "Teacher"),
+                    "subject_id": lookups.get(lookups.subjects, op.subject, "Subject"),
+                }
+            else:
+                values = {
+                    "student_id": lookups.get(
+                        lookups.students, full_name(op.name), "Student"),
+                    "group_id": lookups.get(lookups.groups, op.group, "Group"),
+                }
+            # A link that already exists is skipped instead of failing the
+            # transaction on the unique constraint
+            conn = await self.session.connection()
+            await self.session.execute(insert_ignore(conn, model).values(values))
+            self.tables.add(model.__tablename__)
+            return
+        self.session.add(row)
+        self.tables.add(model.__tablename__)
+        if model in LINKS:
+            # Flushed together at commit, they aren't looked up by later lines
+            return
+        await self.session.flush()
+        if model in PEOPLE:
+            lookup = lookups.teachers if model is Teacher else lookups.students
+            lookup.setdefault((row.first_name, row.last_name), row.id)
+        elif model is Group:
+            lookups.groups.setdefault(row.code, row.id)
+        elif model is Grade:
+            lookups.grades.setdefault(row.code, row.id)
+        elif model is Subject:
+            lookups.subjects.setdefault(row.name, row.id)
+
+    async def update(self, op: argparse.Namespace, model: Base) -> None:
+        _id = read_cli_param("id", op.id, is_required=True)
+        if model in PEOPLE:
+            first_name, last_name = full_name(op.name) if op.name else (None, None)
+            values = {
+                "first_name": first_name, "last_name": last_name,
+                "gender": op.gender, "birthdate": read_birthdate(op.birthdate),
+            }
+        elif model in UPDATE_FIELDS:
+            values = {field: getattr(op, field) for field in UPDATE_FIELDS[model]}
+            if model is Grade and values["value"] is not None:
+                values["value"] = int(values["value"])
+        else:
+            raise Exception(f"Action 'update' isn't supported for the model "
+                            f"'{model.__name__}'")
+        query = update_rows_query(model, _id, values)
+        if query is None:
+            raise Exception("Nothing to update")
+        rows = (await self.session.execute(query)).all()
+        if not rows:
+            raise Exception(f"Row with id '{_id}' doesn't exist in the table "
+                            f"'{model.__table__}'")
+        self.tables.add(model.__tablename__)
+        if model is Grade and values["value"] is not None:
+            self.changed_grades.add(_id)
+
+    async def remove(self, op: argparse.Namespace, model: Base) -> None:
+        ids = op.ids if op.ids else [op.id] if op.id else None
+        criteria = delete_rows_criteria(model, ids, read_filters(op.where, model))
+        # Rows added by the previous lines go first, so the cascade sees them
+        await self.session.flush()
+        conn = await self.session.connection()
+        if not await conn.run_sync(delete_rows_sync, model, criteria):
+            raise Exception(f"No rows were deleted from the table '{model.__table__}'")
+        self.tables.update(cascade_tables(model))
+
+    async def before_commit(self) -> None:
+        if self.changed_grades:
+            conn = await self.session.connection()
+            await conn.run_sync(sync_grade_values, self.changed_grades)
+            await conn.run_sync(rebuild_grade_stats_sync)
+            self.tables.add(StudentGrade.__tablename__)
+            self.changed_grades = set()
+
+    def after_commit(self) -> None:
+        report_cache.invalidate(self.tables)
+        dimensions.invalidate(self.tables)
+        self.tables = set()
+
+
+def record_argv(record: dict) -> list[str]:
+    # cli.py argv of a line, so its values get the same type and choices checks
+    kinds = option_kinds()
+    argv = []
+    for key, value in record.items():
+        option, kind = kinds[key]
+        if value is None:
+            continue
+        if kind == "flag":
+            if not isinstance(value, bool):
+                raise Exception(f"'{key}' should be true or false")
+            if value:
+                argv.append(option)
+            continue
+        items = value if isinstance(value, list) else [value]
+        if any(isinstance(item, (bool, list, dict)) for item in items):
+            raise Exception(f"Invalid value of '{key}': {value!r}")
+        if kind == "append":
+            argv += [f"{option}={item}" for item in items]
+        elif kind == "list":
+            argv += [option, *map(str, items)]
+        elif isinstance(value, list):
+            raise Exception(f"'{key}' should be a single value")
+        else:
+            argv.append(f"{option}={value}")
+    return argv
+
+
+def parse_record(parser: argparse.ArgumentParser, record: Any) -> argparse.Namespace:
+    if not isinstance(record, dict):
+        raise Exception(f"Line should be a JSON object, got {record!r}")
+    unknown = set(record) - set(option_kinds())
+    if unknown:
+        raise Exception(f"Unknown keys {sorted(unknown)}")
+    errors = io.StringIO()
+    try:
+        with redirect_stderr(errors):
+            return parser.parse_args(record_argv(record))
+    except SystemExit:
+        # argparse printed the usage and the error, the error is the last line
+        raise Exception(errors.getvalue().strip().splitlines()[-1])
+
+
+def read_ops(path: str, parser: argparse.ArgumentParser) -> list[tuple[int, Any]]:
+    """(line number, Namespace or the Exception that made the line invalid)"""
+    ops = []
+    with open(path, encoding="utf-8") as file:
+        for line_num, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            try:
+                ops.append((line_num, parse_record(parser, json.loads(line))))
+            except Exception as e:
+                ops.append((line_num, e))
+    return ops
+
+
+async def run_batch(
+        path: str, parser: argparse.ArgumentParser, transaction_size: int = 500,
+        rejected_path: str = None,
+) -> dict[str, Any]:
+    if transaction_size <= 0:
+        raise Exception("Transaction size should be a positive number")
+    started_at = time.perf_counter()
+    ops = read_ops(path, parser)
+    failures = [
+        {"line": line_num, "error": repr(op)}
+        for line_num, op in ops if isinstance(op, Exception)
+    ]
+    valid_ops = [(line_num, op) for line_num, op in ops if not isinstance(op, Exception)]
+    applied = 0
+
+    async with AsyncDBSession() as session:
+        runner = BatchRunner(session, Lookups())
+        async with session.begin():
+            await runner.lookups.load(session, (op for _, op in valid_ops))
+        for start in range(0, len(valid_ops), transaction_size):
+            group = valid_ops[start:start + transaction_size]
+            group_failures = []
+            try:
+                async with session.begin():
+                    for line_num, op in group:
+                        try:
+                            await runner.run(op)
+                        except DBAPIError:
+                            raise
+                        except Exception as e:
+                            group_failures.append({"line": line_num, "error": repr(e)})
+                    await runner.before_commit()
+            except Exception as e:
+                # The transaction was rolled back, none of its operations applied
+                failed_lines = {failure["line"] for failure in group_failures}
+                group_failures += [
+                    {"line": line_num, "error": repr(e)}
+                    for line_num, _ in group if line_num not in failed_lines
+                ]
+                # Ids of the rows created by the transaction aren't valid anymore
+                runner.tables, runner.changed_grades = set(), set()
+                runner.lookups = Lookups()
+                async with session.begin():
+                    await runner.lookups.load(session, (op for _, op in valid_ops))
+            else:
+                runner.after_commit()
+            applied += len(group) - len(group_failures)
+            failures += group_failures
+
+    if rejected_path and failures:
+        records = {line_num: op for line_num, op in ops}
+        with open(rejected_path, "w", encoding="utf-8") as file:
+            for failure in sorted(failures, key=lambda f: f["line"]):
+                op = records[failure["line"]]
+                record = vars(op) if isinstance(op, argparse.Namespace) else None
+                file.write(json.dumps(
+                    {**failure, "op": record}, default=str) + "\n")
+
+    seconds = time.perf_counter() - started_at
+    total = applied + len(failures)
+    return {
+        "applied": applied,
+        "failed": len(failures),
+        "seconds": round(seconds, 3),
+        "ops_per_sec": round(total / seconds) if seconds else total,
+        "failures": sorted(failures, key=lambda f: f["line"]),
+    }
+
+
+def log_summary(summary: dict[str, Any]) -> None:
+    for failure in summary["failures"]:
+        logging.info(f"Line {failure['line']} failed: {failure['error']}")
+    logging.info(
+        f"Applied {summary['applied']} and failed {summary['failed']} "
+        f"operations in {summary['seconds']}s ({summary['ops_per_sec']} ops/sec)"
+    )
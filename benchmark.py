@@ -0,0 +1,171 @@
+"""
+Benchmark of the my_select reports over several data sizes.
+
+    python benchmark.py --scales 1 5 20 --repeat 50 --output bench.json
+    python benchmark.py --scales 1 5 20 --baseline bench.json
+    python benchmark.py --reports select_2_additional select_2_additional_window
+
+For every scale factor the DB from SQLALCHEMY_URL is recreated and seeded
+(seed.insert_data_to_db_bulk), so only a local SQLite file or a local
+PostgreSQL is accepted. Every report is then run `--repeat` times bypassing
+the report cache, and p50/p95/p99 latency, returned rows and issued queries
+are written as JSON. With --baseline the run is compared to a previous JSON
+file and the script exits with code 1 if any p95 got slower than
+`--threshold` times the baseline. Reports run inside `read_your_writes()`, so
+with SQLALCHEMY_READ_URL set they still read the DB the benchmark seeded.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from typing import Any
+
+from sqlalchemy import event
+
+import my_select
+from db import (
+    LOCAL_HOSTS, get_engine, get_read_engine, dispose_engine, read_your_writes
+)
+from models import init_models
+from seed import insert_data_to_db_bulk
+
+
+def rows_count(result: Any) -> int:
+    if result is None:
+        return 0
+    if isinstance(result, list):
+        return len(result)
+    return 1
+
+
+def percentiles(samples: list[float]) -> dict[str, float]:
+    if len(samples) < 2:
+        samples = samples * 2
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return {
+        "p50_ms": round(cuts[49] * 1000, 3),
+        "p95_ms": round(cuts[94] * 1000, 3),
+        "p99_ms": round(cuts[98] * 1000, 3),
+    }
+
+
+class QueryCounter:
+    """Counts the statements on the primary and on the read engine."""
+
+    def __init__(self):
+        self.count = 0
+        self.engines = {
+            engine.sync_engine for engine in (get_engine(), get_read_engine())
+        }
+        for engine in self.engines:
+            event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self, *args) -> None:
+        self.count += 1
+
+    def close(self) -> None:
+        for engine in self.engines:
+            event.remove(engine, "before_cursor_execute", self._count)
+
+
+async def benchmark_reports(repeat: int, names: list[str]) -> dict[str, dict]:
+    results = {}
+    reports_args = await my_select.sample_report_args()
+    counter = QueryCounter()
+    try:
+        for name in names:
+            report = my_select.REPORTS[name]
+            # __wrapped__ is the report without the result cache
+            run = getattr(report, "__wrapped__", report)
+            kwargs = reports_args[name]
+            await run(**kwargs)  # warm up
+            samples, rows = [], 0
+            counter.count = 0
+            for _ in range(repeat):
+                started_at = time.perf_counter()
+                result = await run(**kwargs)
+                samples.append(time.perf_counter() - started_at)
+                rows = rows_count(result)
+            results[name] = {
+                **percentiles(samples),
+                "rows": rows,
+                "queries": counter.count / repeat,
+            }
+    finally:
+        counter.close()
+    return results
+
+
+async def run_benchmark(
+        scales: list[float], repeat: int, names: list[str]
+) -> dict[str, Any]:
+    engine = get_engine()
+    engine.echo = False
+    runs = {}
+    # The reports would go to the read DB, which the benchmark doesn't seed
+    with read_your_writes():
+        for scale in scales:
+            await init_models()
+            seed_stats = await insert_data_to_db_bulk(scale=scale)
+            runs[str(scale)] = {
+                "seed": seed_stats,
+                "reports": await benchmark_reports(repeat, names),
+            }
+    await dispose_engine()
+    return {
+        "dialect": engine.dialect.name,
+        "repeat": repeat,
+        "scales": runs,
+    }
+
+
+def find_regressions(
+        current: dict, baseline: dict, threshold: float
+) -> list[str]:
+    regressions = []
+    for scale, run in current["scales"].items():
+        baseline_reports = baseline.get("scales", {}).get(scale, {}).get("reports", {})
+        for name, stats in run["reports"].items():
+            before = baseline_reports.get(name)
+            if before and stats["p95_ms"] > before["p95_ms"] * threshold:
+                regressions.append(
+                    f"scale {scale} {name}: p95 {before['p95_ms']}ms -> "
+                    f"{stats['p95_ms']}ms"
+                )
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark my_select reports")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1, 5])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--reports", nargs="+", choices=list(my_select.REPORTS),
+                        default=list(my_select.REPORTS))
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    parser.add_argument("--baseline", help="JSON of a previous run to compare")
+    parser.add_argument("--threshold", type=float, default=1.2)
+    args = parser.parse_args()
+
+    host = get_engine().url.host
+    if host not in LOCAL_HOSTS:
+        sys.exit(f"The benchmark recreates all tables, refusing to run against "
+                 f"'{host}'. Point SQLALCHEMY_URL to a local DB.")
+
+    report = asyncio.run(run_benchmark(
+        scales=args.scales, repeat=args.repeat, names=args.reports
+    ))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            regressions = find_regressions(report, json.load(file), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
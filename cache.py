@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import functools
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Iterable
+
+REPORT_CACHE_SIZE = int(os.getenv("REPORT_CACHE_SIZE", 256))
+REPORT_CACHE_TTL = float(os.getenv("REPORT_CACHE_TTL", 300))
+
+
+class ReportCache:
+    """
+    LRU cache with a TTL for report results. Every entry remembers the tables it
+    was read from, so a write to a table drops only the dependent entries.
+    """
+
+    def __init__(self, max_size: int = REPORT_CACHE_SIZE, ttl: float = REPORT_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[Hashable, tuple[float, frozenset, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return True, entry[2]
+
+    def set(self, key: Hashable, value: Any, tables: Iterable[str]) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, frozenset(tables), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, tables: Iterable[str]) -> None:
+        tables = set(tables)
+        if not tables:
+            return
+        for key in [k for k, (_, deps, _) in self._entries.items() if deps & tables]:
+            del self._entries[key]
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+report_cache = ReportCache()
+
+
+def cached_report(*models: Any) -> Callable:
+    """
+    Caches the result of a report coroutine by its name and arguments. `models`
+    are the tables the report depends on.
+    """
+    tables = frozenset(model.__tablename__ for model in models)
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = (func.__name__, args, tuple(sorted(kwargs.items())))
+            is_hit, value = report_cache.get(key)
+            if is_hit:
+                return value
+            value = await func(*args, **kwargs)
+            report_cache.set(key, value, tables)
+            return value
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,355 @@
+"""
+Handlers of the cli.py actions. Imported by cli.py only once an action that
+needs the DB is going to run, so `cli.py --help` doesn't load SQLAlchemy.
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import sys
+from datetime import datetime
+from typing import Any
+
+from enums import CLI_ACTIONS
+from models import *
+
+
+def define_action(args_action: str) -> CLI_ACTIONS:
+    actions = list(CLI_ACTIONS)
+    for action in actions:
+        if args_action == action.value:
+            return action.value
+
+
+def read_cli_param(
+        name: str, value: str | datetime, is_required: bool
+) -> str | None:
+    if value:
+        return value
+    else:
+        if is_required:
+            raise Exception(f"'{name}' is required, but the value wasn't passed")
+
+
+async def create_teacher_cli(args: argparse.Namespace):
+    name = read_cli_param(name="name", value=args.name, is_required=True)
+    gender = read_cli_param(
+        name="gender", value=args.gender, is_required=True
+    )
+    birthdate = None
+    try:
+        birthdate_value = datetime.strptime(args.birthdate, "%Y-%m-%d")
+        birthdate = read_cli_param(
+            name="birthdate", value=birthdate_value, is_required=False
+        )
+    except Exception:
+        pass
+    first_name, last_name = name.split()
+
+    await create_teacher(
+        first_name=first_name, last_name=last_name, birthdate=birthdate, gender=gender
+    )
+    logging.info(f"Teacher '{name}' was created in DB")
+
+
+async def update_teacher_cli(args: argparse.Namespace):
+    _id = read_cli_param(name="id", value=args.id, is_required=True)
+    name = read_cli_param(name="name", value=args.name, is_required=False)
+    gender = read_cli_param(
+        name="gender", value=args.gender, is_required=False
+    )
+    birthdate = None
+    try:
+        birthdate_value = datetime.strptime(args.birthdate, "%Y-%m-%d")
+        birthdate = read_cli_param(
+            name="birthdate", value=birthdate_value, is_required=False
+        )
+    except Exception:
+        pass
+    first_name, last_name = name.split() if name else (None, None)
+
+    await update_teacher(
+        _id=_id, first_name=first_name, last_name=last_name, birthdate=birthdate,
+        gender=gender
+    )
+    logging.info(f"Teacher '{name}' was updated in DB")
+
+
+async def create_student_cli(args: argparse.Namespace):
+    name = read_cli_param(
+        name="name", value=args.name, is_required=True
+    )
+    gender = read_cli_param(
+        name="gender", value=args.gender, is_required=True
+    )
+    birthdate = None
+    try:
+        birthdate_value = datetime.strptime(args.birthdate, "%Y-%m-%d")
+        birthdate = read_cli_param(
+            name="birthdate", value=birthdate_value, is_required=False
+        )
+    except Exception:
+        pass
+    first_name, last_name = name.split()
+
+    await create_student(
+        first_name=first_name, last_name=last_name, birthdate=birthdate, gender=gender
+    )
+    logging.info(f"Student '{name}' was created in DB")
+
+
+async def update_student_cli(args: argparse.Namespace):
+    _id = read_cli_param(name="id", value=args.id, is_required=True)
+    name = read_cli_param(name="name", value=args.name, is_required=False)
+    gender = read_cli_param(
+        name="gender", value=args.gender, is_required=False
+    )
+    birthdate = None
+    try:
+        birthdate_value = datetime.strptime(args.birthdate, "%Y-%m-%d")
+        birthdate = read_cli_param(
+            name="birthdate", value=birthdate_value, is_required=False
+        )
+    except Exception:
+        pass
+    first_name, last_name = name.split() if name else (None, None)
+
+    await update_student(
+        _id=_id, first_name=first_name, last_name=last_name, birthdate=birthdate,
+        gender=gender
+    )
+    logging.info(f"Student '{name}' was updated in DB")
+
+
+async def create_group_cli(args: argparse.Namespace):
+    name = read_cli_param(
+        name="name", value=args.name, is_required=True
+    )
+    code = read_cli_param(
+        name="code", value=args.code, is_required=True
+    )
+
+    await create_group(name=name, code=code)
+    logging.info(f"Student group '{name}' was created in DB")
+
+
+async def update_group_cli(args: argparse.Namespace):
+    _id = read_cli_param(name="id", value=args.id, is_required=True)
+    name = read_cli_param(
+        name="name", value=args.name, is_required=False
+    )
+    code = read_cli_param(
+        name="code", value=args.code, is_required=False
+    )
+
+    await update_group(_id=_id, name=name, code=code)
+    logging.info(f"Student group with id '{_id}' was updated in DB")
+
+
+async def create_grade_cli(args: argparse.Namespace):
+    value = read_cli_param(
+        name="value", value=args.value, is_required=True
+    )
+    code = read_cli_param(
+        name="code", value=args.code, is_required=True
+    )
+
+    await create_grade(value=value, code=code)
+    logging.info(f"Grade with value '{value}' and code '{code}' was created in DB")
+
+
+async def update_grade_cli(args: argparse.Namespace):
+    _id = read_cli_param(name="id", value=args.id, is_required=True)
+    value = read_cli_param(
+        name="value", value=args.value, is_required=False
+    )
+    code = read_cli_param(
+        name="code", value=args.code, is_required=False
+    )
+
+    await update_grade(_id=_id, value=int(value) if value else None, code=code)
+    logging.info(f"Grade with id {_id} was updated to the value '{value}'.")
+
+
+async def create_subject_cli(args: argparse.Namespace):
+    name = read_cli_param(
+        name="name", value=args.name, is_required=True
+    )
+    description = read_cli_param(
+        name="description", value=args.description, is_required=True
+    )
+
+    await create_subject(name=name, description=description)
+    logging.info(
+        f"Subject with the name '{name}' and description '{description}' was "
+        f"created in DB"
+    )
+
+
+async def update_subject_cli(args: argparse.Namespace):
+    _id = read_cli_param(name="id", value=args.id, is_required=True)
+    description = read_cli_param(
+        name="description", value=args.description, is_required=False
+    )
+    name = read_cli_param(
+        name="name", value=args.name, is_required=False
+    )
+
+    await update_subject(_id=_id, name=name, description=description)
+    logging.info(f"Subject with id {_id} was updated to the name '{name}' and "
+                 f"description '{description}'.")
+
+
+async def create_student_group_cli(args: argparse.Namespace):
+    name = read_cli_param(
+        name="name", value=args.name, is_required=True
+    )
+    group = read_cli_param(
+        name="group", value=args.group, is_required=True
+    )
+
+    if await create_student_group(student_name=name, group_name=group):
+        logging.info(f"Student '{name}' was added to group '{group}'")
+    else:
+        logging.info(f"Student '{name}' is already in group '{group}'")
+
+
+async def create_teacher_subject_cli(args: argparse.Namespace):
+    name = read_cli_param(
+        name="name", value=args.name, is_required=True
+    )
+    subject = read_cli_param(
+        name="subject", value=args.subject, is_required=True
+    )
+    if await create_teacher_subject(teacher_name=name, subject_name=subject):
+        logging.info(f"Teacher '{name}' was assigned to subject '{subject}'")
+    else:
+        logging.info(f"Teacher '{name}' already teaches subject '{subject}'")
+
+
+async def create_student_grade_cli(args: argparse.Namespace):
+    name = read_cli_param(
+        name="name", value=args.name, is_required=True
+    )
+    subject = read_cli_param(
+        name="subject", value=args.subject, is_required=True
+    )
+    grade = read_cli_param(
+        name="grade", value=args.grade, is_required=True
+    )
+    await create_student_grade(grade_code=grade, student_name=name, subject_name=subject)
+
+
+async def list_all_cli(args: argparse.Namespace, model: Base) -> list[dict]:
+    rows = await find_all_rows(
+        model=model, limit=args.limit, after_id=args.after_id
+    )
+    logging.info(f"Getting rows for the model '{model.__name__}'")
+    return rows
+
+
+async def export_rows_cli(args: argparse.Namespace, model: Base) -> None:
+    from exporter import export_rows
+
+    if args.output:
+        with open(args.output, "w", newline="", encoding="utf-8") as file:
+            rows_count = await export_rows(
+                model=model, file=file, export_format=args.format
+            )
+    else:
+        rows_count = await export_rows(
+            model=model, file=sys.stdout, export_format=args.format
+        )
+    logging.info(f"Exported {rows_count} rows for the model '{model.__name__}'")
+
+
+def read_filters(filters: list[str] | None, model: Base) -> dict[str, Any]:
+    result = {}
+    for item in filters or ():
+        if "=" not in item:
+            raise Exception(f"Filter '{item}' should look like column=value")
+        name, value = item.split("=", 1)
+        column = model.__table__.columns.get(name)
+        if column is None:
+            raise Exception(f"Column '{name}' doesn't exist in the table "
+                            f"'{model.__table__}'")
+        result[name] = int(value) if column.type.python_type is int else value
+    return result
+
+
+async def delete_db_row_cli(args: argparse.Namespace, model: Base) -> None:
+    if args.ids or args.where:
+        deleted = await delete_rows(
+            model=model, ids=args.ids, filters=read_filters(args.where, model)
+        )
+        logging.info(f"{deleted} rows for the model '{model.__name__}' were deleted")
+        return
+    _id = read_cli_param(
+        name="id", value=args.id, is_required=True
+    )
+    is_deleted = await delete_db_row_by_id(model=model, row_id=_id)
+    if is_deleted:
+        logging.info(f"Row with id {_id} for the model '{model.__name__}' was deleted")
+
+
+async def import_file_cli(args: argparse.Namespace, model: Base) -> None:
+    from importer import import_file
+
+    path = read_cli_param(name="file", value=args.file, is_required=True)
+    stats = await import_file(
+        model=model, path=path, batch_size=args.batch_size,
+        rejected_path=args.rejected
+    )
+    logging.info(
+        f"Imported {stats['imported']} rows into '{model.__name__}' from '{path}' "
+        f"in {stats['seconds']}s ({stats['rows_per_sec']} rows/sec), "
+        f"{stats['rejected']} rows were rejected"
+    )
+
+
+METHODS = {
+    CLI_ACTIONS.CREATE.value: {
+        Teacher.__name__: create_teacher_cli,
+        Subject.__name__: create_subject_cli,
+        Student.__name__: create_student_cli,
+        Grade.__name__: create_grade_cli,
+        Group.__name__: create_group_cli,
+        StudentGroup.__name__: create_student_group_cli,
+        TeacherSubject.__name__: create_teacher_subject_cli,
+        StudentGrade.__name__: create_student_grade_cli,
+    },
+    CLI_ACTIONS.UPDATE.value: {
+        Teacher.__name__: update_teacher_cli,
+        Subject.__name__: update_subject_cli,
+        Student.__name__: update_student_cli,
+        Grade.__name__: update_grade_cli,
+        Group.__name__: update_group_cli,
+    }
+}
+
+
+async def run_action(args: argparse.Namespace) -> None:
+    _model: str = read_cli_param(
+        name="model", value=args.model, is_required=True
+    )
+    model: Base = MODELS.get(_model)
+    if model is None:
+        raise Exception(f"Unknown model '{_model}', expected one of {list(MODELS)}")
+    action = read_cli_param(
+        name="action", value=args.action, is_required=True
+    )
+    if action == CLI_ACTIONS.LIST.value and args.format:
+        await export_rows_cli(args, model=model)
+    elif action == CLI_ACTIONS.LIST.value:
+        rows = await list_all_cli(args, model=model)
+        print(rows)
+    elif action == CLI_ACTIONS.REMOVE.value:
+        await delete_db_row_cli(args, model=model)
+    elif action == CLI_ACTIONS.IMPORT.value:
+        await import_file_cli(args, model=model)
+    else:
+        method = METHODS.get(action, {}).get(_model)
+        if method is None:
+            raise Exception(f"Action '{action}' isn't supported for the model "
+                            f"'{_model}'")
+        await method(args)
@@ -0,0 +1,118 @@
+"""
+Daemon mode of cli.py: one process keeps the event loop, the engine pool and
+the caches alive and runs the commands sent to it over a local Unix socket.
+
+    python cli.py --serve /tmp/cli.sock &
+    python cli.py --connect /tmp/cli.sock -a list -m Teacher
+
+The protocol is one JSON line per command (the cli.py argv) and one JSON line
+per response: {"ok": bool, "output": str, "error": str | None}. Commands run
+one at a time, their stdout and log messages are sent back as "output".
+Only the standard library is imported here, so the client stays as light as
+`cli.py --help`.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import io
+import json
+import logging
+import os
+import socket
+import sys
+from contextlib import redirect_stderr, redirect_stdout
+
+
+async def execute(parser: argparse.ArgumentParser, argv: list[str]) -> dict:
+    from cli_actions import run_action
+
+    output = io.StringIO()
+    handler = logging.StreamHandler(output)
+    handler.setLevel(logging.INFO)
+    handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    logging.getLogger().addHandler(handler)
+    try:
+        with redirect_stdout(output), redirect_stderr(output):
+            args = parser.parse_args(argv)
+            if args.serve or args.connect:
+                raise Exception("--serve and --connect can't be sent to a running "
+                                "server")
+            if args.batch:
+                from batch import log_summary, run_batch
+
+                summary = await run_batch(
+                    args.batch, parser, transaction_size=args.transaction_size,
+                    rejected_path=args.rejected,
+                )
+                log_summary(summary)
+                if summary["failed"]:
+                    return {"ok": False, "output": output.getvalue(), "error": None}
+            else:
+                await run_action(args)
+            if args.stats:
+                from db import pool_status
+                from instrumentation import query_stats
+
+                print(query_stats.format())
+                print(f"pool: {pool_status()}")
+        return {"ok": True, "output": output.getvalue(), "error": None}
+    except SystemExit:
+        # argparse already wrote the usage error to output
+        return {"ok": False, "output": output.getvalue(), "error": None}
+    except Exception as e:
+        return {"ok": False, "output": output.getvalue(), "error": repr(e)}
+    finally:
+        logging.getLogger().removeHandler(handler)
+
+
+async def serve(path: str, parser: argparse.ArgumentParser) -> None:
+    from db import dispose_engine
+
+    lock = asyncio.Lock()
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while line := await reader.readline():
+                async with lock:
+                    response = await execute(parser, json.loads(line))
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        finally:
+            writer.close()
+
+    if os.path.exists(path):
+        os.unlink(path)
+    server = await asyncio.start_unix_server(handle, path)
+    logging.info(f"Serving cli.py commands on '{path}'")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if os.path.exists(path):
+            os.unlink(path)
+        await dispose_engine()
+
+
+# Options with file paths, made absolute since the server has its own cwd
+PATH_OPTIONS = ("file", "output", "rejected", "batch")
+
+
+def client_argv(args: argparse.Namespace, argv: list[str]) -> list[str]:
+    # The last value of an option wins, so the absolute paths go at the end,
+    # and the empty --connect clears the client's own one
+    return argv + [
+        f"--{dest}={os.path.abspath(getattr(args, dest))}"
+        for dest in PATH_OPTIONS if getattr(args, dest)
+    ] + ["--connect="]
+
+
+def send_command(path: str, argv: list[str]) -> int:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        sock.sendall(json.dumps(argv).encode() + b"\n")
+        response = json.loads(sock.makefile(encoding="utf-8").readline())
+    sys.stdout.write(response["output"])
+    if response["error"]:
+        print(response["error"], file=sys.stderr)
+    return 0 if response["ok"] else 1
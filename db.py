@@ -0,0 +1,268 @@
+"""
+Engine and session factory. The engine is created on first use from the
+[database] section of the ini file named by DB_CONFIG (optional) and the
+environment (loaded from .env), the environment taking precedence:
+
+    SQLALCHEMY_URL           url
+    SQLALCHEMY_READ_URL      read_url (optional replica for the reports)
+    SQLALCHEMY_ECHO          echo
+    DB_POOL_SIZE             pool_size
+    DB_MAX_OVERFLOW          max_overflow
+    DB_POOL_TIMEOUT          pool_timeout
+    DB_POOL_RECYCLE          pool_recycle
+    DB_POOL_PRE_PING         pool_pre_ping
+    DB_STATEMENT_CACHE_SIZE  prepared_statement_cache_size (asyncpg only)
+    DB_READ_RETRY_SECONDS    read_retry_seconds
+    DB_READ_YOUR_WRITES_SECONDS  read_your_writes_seconds
+
+AsyncDBSession is bound to the primary (url). AsyncReadSession, used by the
+reports and listings, reads from read_url when it is set. When the read DB
+can't be connected to, reads go to the primary for read_retry_seconds (30).
+Reads go to the primary as well within read_your_writes_seconds (0) after a
+commit on the primary in this process, and inside `with read_your_writes():`.
+"""
+from __future__ import annotations
+
+import configparser
+import logging
+import os
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Iterator
+
+from dotenv import load_dotenv
+from sqlalchemy import make_url, event
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import (
+    create_async_engine, async_sessionmaker, AsyncSession, AsyncEngine
+)
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from instrumentation import instrument_engine
+
+load_dotenv()
+
+DB_CONFIG_OPTIONS = {
+    "url": ("SQLALCHEMY_URL", str),
+    "read_url": ("SQLALCHEMY_READ_URL", str),
+    "echo": ("SQLALCHEMY_ECHO", bool),
+    "pool_size": ("DB_POOL_SIZE", int),
+    "max_overflow": ("DB_MAX_OVERFLOW", int),
+    "pool_timeout": ("DB_POOL_TIMEOUT", float),
+    "pool_recycle": ("DB_POOL_RECYCLE", int),
+    "pool_pre_ping": ("DB_POOL_PRE_PING", bool),
+    "prepared_statement_cache_size": ("DB_STATEMENT_CACHE_SIZE", int),
+    "read_retry_seconds": ("DB_READ_RETRY_SECONDS", float),
+    "read_your_writes_seconds": ("DB_READ_YOUR_WRITES_SECONDS", float),
+}
+QUEUE_POOL_OPTIONS = ("pool_size", "max_overflow", "pool_timeout")
+# Hosts the destructive tools (benchmark.py, explain_selects.py --compare) accept
+LOCAL_HOSTS = (None, "", "localhost", "127.0.0.1", "::1")
+
+
+def _parse(value: str, value_type: type) -> Any:
+    if value_type is bool:
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    return value_type(value)
+
+
+def load_db_config(path: str = None) -> dict[str, Any]:
+    config = {}
+    path = path or os.getenv("DB_CONFIG")
+    if path:
+        parser = configparser.ConfigParser()
+        if not parser.read(path):
+            raise Exception(f"DB config file '{path}' can't be read")
+        section = parser["database"] if parser.has_section("database") else {}
+        for option, (_, value_type) in DB_CONFIG_OPTIONS.items():
+            if option in section:
+                config[option] = _parse(section[option], value_type)
+    for option, (env_name, value_type) in DB_CONFIG_OPTIONS.items():
+        if os.getenv(env_name):
+            config[option] = _parse(os.getenv(env_name), value_type)
+    return config
+
+
+class MonitoredQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that counts checkouts which had to wait for a free connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.waits = 0
+        self.wait_seconds = 0.0
+
+    def _do_get(self):
+        is_exhausted = (
+            self._max_overflow > -1
+            and self.checkedin() == 0
+            and self.overflow() >= self._max_overflow
+        )
+        if not is_exhausted:
+            return super()._do_get()
+        started_at = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self.waits += 1
+            self.wait_seconds += time.perf_counter() - started_at
+
+
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record) -> None:
+    # SQLite ignores foreign keys, and so ON DELETE CASCADE, unless enabled
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+def create_engine_from_config(config: dict[str, Any]) -> AsyncEngine:
+    if not config.get("url"):
+        raise Exception("DB url isn't configured, set SQLALCHEMY_URL")
+    url = make_url(config["url"])
+    kwargs: dict[str, Any] = {"echo": config.get("echo", False)}
+    for option in ("pool_recycle", "pool_pre_ping"):
+        if option in config:
+            kwargs[option] = config[option]
+    if url.get_backend_name() != "sqlite":
+        kwargs["poolclass"] = MonitoredQueuePool
+        for option in QUEUE_POOL_OPTIONS:
+            if option in config:
+                kwargs[option] = config[option]
+    if url.get_driver_name() == "asyncpg" and "prepared_statement_cache_size" in config:
+        kwargs["connect_args"] = {
+            "prepared_statement_cache_size": config["prepared_statement_cache_size"]
+        }
+    engine = create_async_engine(url, **kwargs)
+    if url.get_backend_name() == "sqlite":
+        event.listen(engine.sync_engine, "connect", _enable_sqlite_foreign_keys)
+    instrument_engine(engine)
+    return engine
+
+
+_engine: AsyncEngine | None = None
+_session_maker: async_sessionmaker | None = None
+_read_engine: AsyncEngine | None = None
+_config: dict[str, Any] = {}
+# monotonic time until which the read DB isn't tried after a failed connect
+_read_down_until = 0.0
+# monotonic time of the last commit on the primary
+_last_write_at = float("-inf")
+_read_from_primary: ContextVar[bool] = ContextVar("read_from_primary", default=False)
+
+
+def _track_write(connection) -> None:
+    global _last_write_at
+    _last_write_at = time.monotonic()
+
+
+def get_engine() -> AsyncEngine:
+    global _engine, _session_maker, _config
+    if _engine is None:
+        _config = load_db_config()
+        _engine = create_engine_from_config(_config)
+        event.listen(_engine.sync_engine, "commit", _track_write)
+        _session_maker = async_sessionmaker(
+            bind=_engine, expire_on_commit=False, class_=AsyncSession
+        )
+    return _engine
+
+
+def get_read_engine() -> AsyncEngine:
+    # Engine of read_url, the primary one when read_url isn't configured
+    global _read_engine
+    engine = get_engine()
+    if not _config.get("read_url"):
+        return engine
+    if _read_engine is None:
+        _read_engine = create_engine_from_config({**_config, "url": _config["read_url"]})
+    return _read_engine
+
+
+async def dispose_engine() -> None:
+    global _engine, _session_maker, _read_engine
+    for engine in (_read_engine, _engine):
+        if engine is not None:
+            await engine.dispose()
+    _engine, _session_maker, _read_engine = None, None, None
+
+
+class LazySessionMaker:
+    # Drop-in for async_sessionmaker that builds the engine on the first session
+    def __call__(self, **kwargs) -> AsyncSession:
+        get_engine()
+        return _session_maker(**kwargs)
+
+
+AsyncDBSession = LazySessionMaker()
+
+
+@contextmanager
+def read_your_writes() -> Iterator[None]:
+    """Reads of the current task inside the block go to the primary."""
+    token = _read_from_primary.set(True)
+    try:
+        yield
+    finally:
+        _read_from_primary.reset(token)
+
+
+def _reads_from_replica() -> bool:
+    engine = get_engine()
+    now = time.monotonic()
+    return (
+        get_read_engine() is not engine
+        and not _read_from_primary.get()
+        and now >= _read_down_until
+        and now - _last_write_at >= _config.get("read_your_writes_seconds", 0)
+    )
+
+
+@asynccontextmanager
+async def _read_session(**kwargs) -> AsyncIterator[AsyncSession]:
+    global _read_down_until
+    conn = None
+    if _reads_from_replica():
+        try:
+            conn = await get_read_engine().connect()
+        except (OSError, DBAPIError) as e:
+            logging.warning(f"Read DB isn't available, reading from the primary: {e!r}")
+            _read_down_until = time.monotonic() + _config.get("read_retry_seconds", 30)
+    if conn is None:
+        conn = await get_engine().connect()
+    try:
+        async with AsyncSession(bind=conn, expire_on_commit=False, **kwargs) as session:
+            yield session
+    finally:
+        await conn.close()
+
+
+class LazyReadSessionMaker:
+    # Same usage as AsyncDBSession: `async with AsyncReadSession() as session:`
+    def __call__(self, **kwargs):
+        return _read_session(**kwargs)
+
+
+AsyncReadSession = LazyReadSessionMaker()
+
+
+def pool_status(engine: AsyncEngine = None) -> dict[str, Any]:
+    engine = engine or _engine
+    if engine is None:
+        return {"engine": "not created"}
+    pool = engine.sync_engine.pool
+    status = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update({
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+        })
+    if isinstance(pool, MonitoredQueuePool):
+        status.update({
+            "waits": pool.waits,
+            "wait_ms": round(pool.wait_seconds * 1000, 3),
+        })
+    if engine is _engine and _read_engine is not None:
+        status["read"] = pool_status(_read_engine)
+    return status
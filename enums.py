@@ -1,5 +1,7 @@
 import enum
 
+EXPORT_FORMATS = ("ndjson", "csv")
+
 
 class GENDER(enum.Enum):
     MALE = "M"
@@ -31,3 +33,4 @@ class CLI_ACTIONS(enum.Enum):
     UPDATE = "update"
     REMOVE = "remove"
     LIST = "list"
+    IMPORT = "import"
@@ -0,0 +1,74 @@
+"""
+Prints EXPLAIN plans for every my_select report.
+
+    python explain_selects.py            # plans with the current indexes
+    python explain_selects.py --compare  # plans without and with the indexes
+
+With --compare the indexes from models.py are dropped inside a transaction
+that is rolled back afterwards, so the DB is left untouched (needs a DB with
+transactional DDL: PostgreSQL or SQLite). Until the rollback the DROP INDEX
+statements hold ACCESS EXCLUSIVE locks on PostgreSQL (the whole DB on SQLite),
+which blocks every other query on those tables, so --compare only runs against
+a local DB.
+"""
+import argparse
+import asyncio
+import sys
+
+from sqlalchemy import Select
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlalchemy.schema import DropIndex
+
+import my_select
+from db import LOCAL_HOSTS, get_engine, dispose_engine
+from models import Base
+
+
+async def explain(conn: AsyncConnection, query: Select) -> list[str]:
+    sql = str(query.compile(
+        dialect=conn.dialect, compile_kwargs={"literal_binds": True}
+    ))
+    prefix = "EXPLAIN QUERY PLAN" if conn.dialect.name == "sqlite" else "EXPLAIN"
+    rows = await conn.exec_driver_sql(f"{prefix} {sql}")
+    return [" | ".join(str(value) for value in row) for row in rows]
+
+
+async def print_plans(conn: AsyncConnection, queries: dict[str, Select], title: str):
+    print(f"===== {title} =====")
+    for name, query in queries.items():
+        print(f"--- {name}")
+        for line in await explain(conn, query):
+            print(f"    {line}")
+
+
+async def main(args: argparse.Namespace):
+    reports_args = await my_select.sample_report_args(subject_name=args.subject)
+    queries = {
+        name: getattr(my_select, f"{name}_query")(**kwargs)
+        for name, kwargs in reports_args.items()
+    }
+    async with get_engine().connect() as conn:
+        if args.compare:
+            if conn.dialect.name == "sqlite":
+                # pysqlite doesn't open a transaction before DDL by itself
+                await conn.exec_driver_sql("BEGIN")
+            for table in Base.metadata.sorted_tables:
+                for index in table.indexes:
+                    await conn.execute(DropIndex(index, if_exists=True))
+            await print_plans(conn, queries, "without indexes")
+            await conn.rollback()
+        await print_plans(conn, queries, "with indexes")
+    await dispose_engine()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="EXPLAIN my_select reports")
+    parser.add_argument("--compare", action="store_true")
+    parser.add_argument("--subject", default="MATH")
+    args = parser.parse_args()
+
+    host = get_engine().url.host
+    if args.compare and host not in LOCAL_HOSTS:
+        sys.exit(f"--compare locks the tables while the plans print, refusing to "
+                 f"run against '{host}'. Point SQLALCHEMY_URL to a local DB.")
+    asyncio.run(main(args))
@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import csv
+import json
+from typing import TextIO
+
+from enums import EXPORT_FORMATS
+from models import Base, stream_rows
+
+CHUNK_SIZE = 1000
+
+
+async def export_rows(
+        model: Base, file: TextIO, export_format: str = "ndjson",
+        chunk_size: int = CHUNK_SIZE
+) -> int:
+    """
+    Writes all rows of `model` to `file` chunk by chunk as JSON lines or CSV,
+    flushing after every chunk. Returns the number of written rows.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise Exception(f"Unknown export format '{export_format}', expected one "
+                        f"of {EXPORT_FORMATS}")
+    columns = [column.name for column in model.__table__.columns]
+    writer = None
+    if export_format == "csv":
+        writer = csv.DictWriter(file, fieldnames=columns)
+        writer.writeheader()
+
+    rows_count = 0
+    async for chunk in stream_rows(model=model, chunk_size=chunk_size):
+        if writer:
+            writer.writerows(chunk)
+        else:
+            file.writelines(json.dumps(row, default=str) + "\n" for row in chunk)
+        file.flush()
+        rows_count += len(chunk)
+    return rows_count
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import csv
+import json
+import logging
+import time
+from typing import Callable, Iterator
+
+from models import (
+    Base,
+    dimensions,
+    StudentGrade,
+    StudentGroup,
+    insert_rows,
+    get_students_ids,
+    get_grades_ids,
+    get_subjects_ids,
+    get_groups_ids,
+)
+
+BATCH_SIZE = 5000
+
+
+def json_record(line: str) -> dict:
+    try:
+        record = json.loads(line)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"invalid JSON: {e}")
+    if not isinstance(record, dict):
+        raise ValueError(f"not a JSON object: {line.strip()}")
+    return record
+
+
+def read_records(path: str) -> Iterator[tuple[int, dict | str]]:
+    """
+    Yields (line number, record) pairs one by one. Files with '.ndjson' or
+    '.jsonl' extension are read as JSON lines, everything else as CSV with a
+    header row. JSON lines are yielded as text, `json_record` parses them, so
+    a malformed line is rejected alone.
+    """
+    with open(path, newline="", encoding="utf-8") as file:
+        if path.endswith((".ndjson", ".jsonl")):
+            for line_no, line in enumerate(file, start=1):
+                if line.strip():
+                    yield line_no, line.rstrip("\r\n")
+        else:
+            reader = csv.DictReader(file)
+            for record in reader:
+                yield reader.line_num, record
+
+
+def _text(record: dict, key: str) -> str:
+    # JSON lines can hold numbers, lists or objects where a name is expected
+    value = record.get(key)
+    if value is None:
+        raise ValueError(f"missing {key}")
+    if not isinstance(value, str):
+        raise ValueError(f"{key} should be a string, got {value!r}")
+    return value
+
+
+def _student_id(record: dict, lookups: dict) -> int:
+    name = _text(record, "name").split()
+    if len(name) != 2:
+        raise ValueError(f"invalid student name '{record.get('name')}'")
+    student_id = lookups["students"].get(tuple(name))
+    if student_id is None:
+        raise ValueError(f"unknown student '{record.get('name')}'")
+    return student_id
+
+
+def _lookup(record: dict, key: str, lookups: dict, table: str) -> int:
+    _id = lookups[table].get(_text(record, key))
+    if _id is None:
+        raise ValueError(f"unknown {key} '{record.get(key)}'")
+    return _id
+
+
+def student_grade_row(record: dict, lookups: dict) -> dict:
+    return {
+        "student_id": _student_id(record, lookups),
+        "subject_id": _lookup(record, "subject", lookups, "subjects"),
+        "grade_id": _lookup(record, "grade", lookups, "grades"),
+    }
+
+
+def student_group_row(record: dict, lookups: dict) -> dict:
+    return {
+        "student_id": _student_id(record, lookups),
+        "group_id": _lookup(record, "group", lookups, "groups"),
+    }
+
+
+IMPORTERS: dict[str, tuple[Callable[[dict, dict], dict], dict]] = {
+    StudentGrade.__name__: (
+        student_grade_row,
+        {
+            "students": get_students_ids,
+            "subjects": get_subjects_ids,
+            "grades": get_grades_ids,
+        },
+    ),
+    StudentGroup.__name__: (
+        student_group_row,
+        {"students": get_students_ids, "groups": get_groups_ids},
+    ),
+}
+
+
+async def import_file(
+        model: Base, path: str, batch_size: int = BATCH_SIZE,
+        rejected_path: str = None
+) -> dict[str, float]:
+    """
+    Streams `path` into the table of `model`. Names are resolved against lookup
+    tables loaded once before the import, valid rows are written in batches
+    (each batch in its own transaction) and invalid ones are reported with the
+    reason, either to `rejected_path` as JSON lines or to the log.
+    """
+    if model.__name__ not in IMPORTERS:
+        raise Exception(f"Import isn't supported for the model '{model.__name__}'")
+    make_row, lookup_loaders = IMPORTERS[model.__name__]
+    # Loaded once for the whole file, so rows written by other processes count
+    dimensions.invalidate(dimensions.tables)
+    lookups = {name: await loader() for name, loader in lookup_loaders.items()}
+
+    started_at = time.perf_counter()
+    imported, rejected = 0, []
+    batch = []
+    for line_no, record in read_records(path):
+        try:
+            if isinstance(record, str):
+                record = json_record(record)
+            batch.append(make_row(record, lookups))
+        except ValueError as e:
+            rejected.append({"line": line_no, "record": record, "reason": str(e)})
+            continue
+        if len(batch) >= batch_size:
+            imported += await insert_rows(model=model, rows=batch,
+                                          batch_size=batch_size)
+            batch = []
+    imported += await insert_rows(model=model, rows=batch, batch_size=batch_size)
+    elapsed = time.perf_counter() - started_at
+
+    if rejected_path:
+        with open(rejected_path, "w", encoding="utf-8") as file:
+            for item in rejected:
+                file.write(json.dumps(item) + "\n")
+    else:
+        for item in rejected:
+            logging.warning(f"Line {item['line']} was rejected: {item['reason']}")
+    return {
+        "imported": imported,
+        "rejected": len(rejected),
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(imported / elapsed) if elapsed else imported,
+    }
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import logging
+import os
+import sys
+import time
+from collections import defaultdict
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+try:
+    import greenlet
+except ImportError:  # pragma: no cover - installed together with SQLAlchemy asyncio
+    greenlet = None
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 100))
+# Statements are attributed to the outermost function of these modules
+INSTRUMENTED_MODULES = ("my_select", "models")
+
+logger = logging.getLogger("queries")
+
+
+def find_caller() -> str:
+    """
+    Name of the outermost my_select/models function on the stack. Async
+    sessions run the DBAPI calls in a greenlet, so the frames of the awaiting
+    coroutines are reached through the parent greenlets.
+    """
+    caller = "unknown"
+    frame = sys._getframe(1)
+    current = greenlet.getcurrent() if greenlet else None
+    while frame is not None:
+        module = frame.f_globals.get("__name__")
+        if module in INSTRUMENTED_MODULES:
+            caller = f"{module}.{frame.f_code.co_name}"
+        frame = frame.f_back
+        if frame is None and current is not None:
+            current = current.parent
+            frame = current.gr_frame if current is not None else None
+    return caller
+
+
+class QueryStats:
+    def __init__(self, slow_query_ms: float = SLOW_QUERY_MS):
+        self.slow_query_ms = slow_query_ms
+        self.functions: dict[str, dict] = defaultdict(
+            lambda: {"calls": 0, "total_ms": 0.0, "max_ms": 0.0, "rows_written": 0,
+                     "unknown_writes": 0}
+        )
+        self.slow_queries = 0
+
+    def record(
+            self, caller: str, statement: str, duration_ms: float,
+            rows_written: int | None,
+    ) -> None:
+        # rows_written is None for writes whose row count the driver doesn't know
+        stats = self.functions[caller]
+        stats["calls"] += 1
+        stats["total_ms"] += duration_ms
+        stats["max_ms"] = max(stats["max_ms"], duration_ms)
+        if rows_written is None:
+            stats["unknown_writes"] += 1
+        else:
+            stats["rows_written"] += rows_written
+        if duration_ms >= self.slow_query_ms:
+            self.slow_queries += 1
+            logger.warning(
+                f"Slow query ({duration_ms:.1f} ms) in {caller}: {statement}"
+            )
+
+    def snapshot(self) -> dict[str, dict]:
+        return {
+            caller: {**stats, "total_ms": round(stats["total_ms"], 3),
+                     "max_ms": round(stats["max_ms"], 3)}
+            for caller, stats in sorted(
+                self.functions.items(), key=lambda item: -item[1]["total_ms"]
+            )
+        }
+
+    def reset(self) -> None:
+        self.functions.clear()
+        self.slow_queries = 0
+
+    def format(self) -> str:
+        lines = [f"{'function':<45} {'calls':>7} {'total ms':>10} {'max ms':>10} "
+                 f"{'written':>8}"]
+        for caller, stats in self.snapshot().items():
+            # "?": some writes (UPDATE ... RETURNING on aiosqlite) have no count
+            written = str(stats["rows_written"])
+            if stats["unknown_writes"]:
+                written = f"{written}+?" if stats["rows_written"] else "?"
+            lines.append(
+                f"{caller:<45} {stats['calls']:>7} {stats['total_ms']:>10.2f} "
+                f"{stats['max_ms']:>10.2f} {written:>8}"
+            )
+        lines.append(f"slow queries (>= {self.slow_query_ms} ms): {self.slow_queries}")
+        return "\n".join(lines)
+
+
+query_stats = QueryStats()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started_at", []).append(
+        (time.perf_counter(), find_caller())
+    )
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started_at, caller = conn.info["query_started_at"].pop()
+    duration_ms = (time.perf_counter() - started_at) * 1000
+    # rowcount is only known for INSERT/UPDATE/DELETE, it's -1 for SELECTs on
+    # aiosqlite and asyncpg until the rows are fetched, and for statements
+    # with RETURNING on aiosqlite
+    is_dml = context is not None and (
+        context.isinsert or context.isupdate or context.isdelete
+    )
+    rows_written = 0
+    if is_dml:
+        rows_written = cursor.rowcount if cursor.rowcount >= 0 else None
+    query_stats.record(caller, statement, duration_ms, rows_written)
+
+
+def _handle_error(exception_context) -> None:
+    # A failed statement never reaches after_cursor_execute, its entry is
+    # popped here so the list doesn't grow on pooled connections
+    conn = exception_context.connection
+    started = conn.info.get("query_started_at") if conn is not None else None
+    if exception_context.execution_context is not None and started:
+        started_at, caller = started.pop()
+        query_stats.record(
+            caller, exception_context.statement,
+            (time.perf_counter() - started_at) * 1000, 0,
+        )
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    sync_engine = engine.sync_engine
+    if not event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(sync_engine, "handle_error", _handle_error)
@@ -1,34 +1,38 @@
 from __future__ import annotations
 
+import argparse
 import asyncio
 import logging
 import os
-from typing import Any, Tuple, Sequence, List
+from collections import defaultdict
+from itertools import chain
+from typing import Any, Tuple, Sequence, List, AsyncIterator, Iterable
 
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 
-from sqlalchemy import Integer, String, select, func, and_, Row, inspect
-from sqlalchemy.orm import relationship, mapped_column, Mapped
+from sqlalchemy import (
+    Integer, String, select, func, and_, Row, inspect, insert, Index, delete,
+    event, literal, union_all, tuple_, Connection, update, UniqueConstraint
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import relationship, mapped_column, Mapped, Session
 from sqlalchemy.sql.schema import ForeignKey
 from sqlalchemy.sql.sqltypes import DateTime
-from dotenv import load_dotenv
 
+from cache import report_cache
+from db import AsyncDBSession, AsyncReadSession, get_engine
 from enums import GENDER, SUBJECT
 
-load_dotenv()
-
-engine = create_async_engine(os.getenv("SQLALCHEMY_URL"), echo=True)
-AsyncDBSession = async_sessionmaker(
-    bind=engine, expire_on_commit=False, class_=AsyncSession
-)
 Base = declarative_base()
-Base.metadata.bind = engine
 
 
 class Student(Base):
     __tablename__ = "students" # !!!
+    __table_args__ = (
+        Index("ix_students_first_name_last_name", "first_name", "last_name"),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     first_name: Mapped[str] = mapped_column(String(50), nullable=False)
     last_name: Mapped[str] = mapped_column(String(50), nullable=False)
@@ -38,15 +42,18 @@ class Student(Base):
 
     # Relationship to StudentGrade with back_populates 'student'
     grades = relationship("StudentGrade", back_populates="student",
-                          cascade="all, delete")
+                          cascade="all, delete",
+                          passive_deletes=True)
     # Relationship to StudentGroup with back_populates 'student'
     group = relationship("StudentGroup", back_populates="student",
-                          cascade="all, delete")
+                          cascade="all, delete",
+                          passive_deletes=True)
 
 
 
 class Grade(Base):
     __tablename__ = "grades" # !!!
+    __table_args__ = (Index("ix_grades_code", "code"),)
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     value: Mapped[int] = mapped_column(Integer, nullable=False)
     code: Mapped[str] = mapped_column(String(50), nullable=False)
@@ -55,39 +62,66 @@ class Grade(Base):
 
     # Relationship to StudentGrade with back_populates 'student'
     students_grades = relationship("StudentGrade", back_populates="grade",
-                                   cascade="all, delete")
+                                   cascade="all, delete",
+                                   passive_deletes=True)
 
 
 class Group(Base):
     __tablename__ = "groups" # !!!
+    __table_args__ = (Index("ix_groups_code", "code"),)
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     name: Mapped[str] = mapped_column(String(50), nullable=False)
     code: Mapped[str] = mapped_column(String(50), nullable=False)
 
     # Relationship to StudentGroup with back_populates 'groups'
     student_group = relationship("StudentGroup", back_populates="groups",
-                                 cascade="all, delete")
+                                 cascade="all, delete",
+                                 passive_deletes=True)
 
 
 class Subject(Base):
     __tablename__ = "subjects"
+    __table_args__ = (Index("ix_subjects_name", "name"),)
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     name: Mapped[str] = mapped_column(String(50), nullable=False)
     description: Mapped[str] = mapped_column(String(250), nullable=True)
     teacher_subjects = relationship("TeacherSubject", back_populates="subject",
-                                    cascade="all, delete")
+                                    cascade="all, delete",
+                                    passive_deletes=True)
     # Relationship to Subject with back_populates 'students_grades'
     students_grades_subjects = relationship("StudentGrade",
                                             back_populates="student_grades",
-                                            cascade="all, delete")
+                                            cascade="all, delete",
+                                            passive_deletes=True)
 
 
 class StudentGrade(Base):
     __tablename__ = "students_grades" # !!!
+    __table_args__ = (
+        # select_1, select_9, select_10: grades of a student, grouped by subject
+        Index("ix_students_grades_student_subject_grade",
+              "student_id", "subject_id", "grade_id"),
+        # select_2, select_3, select_7: grades filtered by subject
+        Index("ix_students_grades_subject_student_grade",
+              "subject_id", "student_id", "grade_id"),
+        Index("ix_students_grades_grade_id", "grade_id"),
+        # select_2_additional_window: latest grade of every student in a subject
+        Index("ix_students_grades_subject_student_created",
+              "subject_id", "student_id", "created_at"),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    student_id: Mapped[int] = mapped_column(Integer, ForeignKey("students.id"))
-    grade_id: Mapped[int] = mapped_column(Integer, ForeignKey("grades.id"))
-    subject_id: Mapped[int] = mapped_column(Integer, ForeignKey("subjects.id"))
+    student_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("students.id", ondelete="CASCADE")
+    )
+    grade_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("grades.id", ondelete="CASCADE")
+    )
+    subject_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("subjects.id", ondelete="CASCADE")
+    )
+    # Copy of grades.value, so the reports aggregate grades without a join.
+    # Filled on insert and updated together with Grade.value.
+    grade_value: Mapped[int] = mapped_column(Integer, nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
 
     # Relationship to Student with back_populates 'grades'
@@ -101,6 +135,9 @@ class StudentGrade(Base):
 
 class Teacher(Base):
     __tablename__ = "teachers" # !!!
+    __table_args__ = (
+        Index("ix_teachers_first_name_last_name", "first_name", "last_name"),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     first_name: Mapped[str] = mapped_column(String(50), nullable=False)
     last_name: Mapped[str] = mapped_column(String(50), nullable=False)
@@ -108,14 +145,26 @@ class Teacher(Base):
     gender: Mapped[str] = mapped_column(String(1), nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
     subjects = relationship("TeacherSubject", back_populates="teacher",
-                            cascade="all, delete-orphan")
+                            cascade="all, delete-orphan",
+                            passive_deletes=True)
 
 
 class TeacherSubject(Base):
     __tablename__ = "teachers_subjects" # !!!
+    __table_args__ = (
+        # Its unique index also serves the lookups by teacher
+        UniqueConstraint(
+            "teacher_id", "subject_id", name="uq_teachers_subjects_teacher_subject"
+        ),
+        Index("ix_teachers_subjects_subject_teacher", "subject_id", "teacher_id"),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    teacher_id: Mapped[int] = mapped_column(Integer, ForeignKey("teachers.id"))
-    subject_id: Mapped[int] = mapped_column(Integer, ForeignKey("subjects.id"))
+    teacher_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("teachers.id", ondelete="CASCADE")
+    )
+    subject_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("subjects.id", ondelete="CASCADE")
+    )
     subject: Mapped["Subject"] = relationship(Subject, back_populates="teacher_subjects",
                                               single_parent=True)
     teacher: Mapped["Teacher"] = relationship(Teacher, back_populates="subjects",
@@ -124,9 +173,20 @@ class TeacherSubject(Base):
 
 class StudentGroup(Base):
     __tablename__ = "students_groups" # !!!
+    __table_args__ = (
+        Index("ix_students_groups_group_student", "group_id", "student_id"),
+        # Its unique index also serves the lookups by student
+        UniqueConstraint(
+            "student_id", "group_id", name="uq_students_groups_student_group"
+        ),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    student_id: Mapped[int] = mapped_column(Integer, ForeignKey("students.id"))
-    group_id: Mapped[int] = mapped_column(Integer, ForeignKey("groups.id"))
+    student_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("students.id", ondelete="CASCADE")
+    )
+    group_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("groups.id", ondelete="CASCADE")
+    )
 
     # Relationship to Student with back_populates 'group'
     student = relationship("Student", back_populates="group")
@@ -134,6 +194,36 @@ class StudentGroup(Base):
     groups = relationship("Group", back_populates="student_group")
 
 
+class StudentGradeStats(Base):
+    __tablename__ = "students_grades_stats"
+    student_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    grades_sum: Mapped[int] = mapped_column(Integer, nullable=False)
+    grades_count: Mapped[int] = mapped_column(Integer, nullable=False)
+
+
+class StudentSubjectGradeStats(Base):
+    __tablename__ = "students_subjects_grades_stats"
+    student_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    subject_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    grades_sum: Mapped[int] = mapped_column(Integer, nullable=False)
+    grades_count: Mapped[int] = mapped_column(Integer, nullable=False)
+
+
+class SubjectGradeStats(Base):
+    __tablename__ = "subjects_grades_stats"
+    subject_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    grades_sum: Mapped[int] = mapped_column(Integer, nullable=False)
+    grades_count: Mapped[int] = mapped_column(Integer, nullable=False)
+
+
+class GradeStats(Base):
+    # Single row (id = 1) with the totals over the whole students_grades table
+    __tablename__ = "grades_stats"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    grades_sum: Mapped[int] = mapped_column(Integer, nullable=False)
+    grades_count: Mapped[int] = mapped_column(Integer, nullable=False)
+
+
 MODELS = {
     Student.__name__: Student,
     Teacher.__name__: Teacher,
@@ -146,11 +236,256 @@ MODELS = {
 }
 
 
-async def find_all_rows(model: Base) -> list[dict]:
-    async with AsyncDBSession() as session:
-        rows = await session.execute(
-            select(model).order_by(model.id)
+# Grade stats tables and the StudentGrade columns they are grouped by
+GRADE_STATS_KEYS = {
+    StudentGradeStats: ("student_id",),
+    StudentSubjectGradeStats: ("student_id", "subject_id"),
+    SubjectGradeStats: ("subject_id",),
+    GradeStats: (),
+}
+
+
+# Link tables and their unique keys, inserts skip the rows that already exist
+LINK_UNIQUE_KEYS = {
+    TeacherSubject: ("teacher_id", "subject_id"),
+    StudentGroup: ("student_id", "group_id"),
+}
+
+
+def _dialect_insert(connection: Connection, model: Base):
+    dialect_insert = (
+        postgresql.insert if connection.dialect.name == "postgresql" else sqlite.insert
+    )
+    return dialect_insert(model.__table__)
+
+
+def insert_ignore(connection: Connection, model: Base):
+    # INSERT ... ON CONFLICT (unique key) DO NOTHING
+    return _dialect_insert(connection, model).on_conflict_do_nothing(
+        index_elements=list(LINK_UNIQUE_KEYS[model])
+    )
+
+
+def _upsert(connection: Connection, model: Base):
+    statement = _dialect_insert(connection, model)
+    return statement.on_conflict_do_update(
+        index_elements=list(GRADE_STATS_KEYS[model]) or ["id"],
+        set_={
+            "grades_sum": model.grades_sum + statement.excluded.grades_sum,
+            "grades_count": model.grades_count + statement.excluded.grades_count,
+        },
+    )
+
+
+def grade_values(connection: Connection) -> dict[int, int]:
+    return dict(connection.execute(select(Grade.id, Grade.value)).all())
+
+
+def fill_grade_values(connection: Connection, rows: list[dict]) -> None:
+    # Sets "grade_value" of the StudentGrade rows that don't have it yet
+    if all("grade_value" in row for row in rows):
+        return
+    values = grade_values(connection)
+    for row in rows:
+        if "grade_value" not in row:
+            row["grade_value"] = values.get(row["grade_id"])
+
+
+def sync_grade_values(connection: Connection, grade_ids: Iterable[int]) -> None:
+    # Copies grades.value of the given grades to their students_grades rows
+    connection.execute(
+        update(StudentGrade)
+        .where(StudentGrade.grade_id.in_(list(grade_ids)))
+        .values(
+            grade_value=select(Grade.value)
+            .where(Grade.id == StudentGrade.grade_id)
+            .scalar_subquery()
+        )
+    )
+
+
+def apply_grade_stats(
+        connection: Connection, rows: Iterable[tuple[int, int, int]], sign: int
+) -> None:
+    """
+    Adds (sign=1) or subtracts (sign=-1) the (student_id, subject_id, grade_id)
+    rows to the grade stats tables on the given connection, i.e. within the
+    caller's transaction. A row can carry a 4th item, the number of such
+    grades.
+    """
+    values = grade_values(connection)
+    deltas = {model: defaultdict(lambda: [0, 0]) for model in GRADE_STATS_KEYS}
+    for student_id, subject_id, grade_id, *count in rows:
+        if grade_id not in values:
+            continue
+        count = count[0] if count else 1
+        row = {"student_id": student_id, "subject_id": subject_id}
+        for model, key_columns in GRADE_STATS_KEYS.items():
+            delta = deltas[model][tuple(row[c] for c in key_columns) or (1,)]
+            delta[0] += sign * values[grade_id] * count
+            delta[1] += sign * count
+
+    for model, model_deltas in deltas.items():
+        if not model_deltas:
+            continue
+        key_columns = GRADE_STATS_KEYS[model] or ("id",)
+        # Sorted keys, so concurrent writers lock the stats rows in the same
+        # order (and grades_stats last) instead of deadlocking
+        connection.execute(_upsert(connection, model), [
+            {**dict(zip(key_columns, key)), "grades_sum": total, "grades_count": count}
+            for key, (total, count) in sorted(model_deltas.items())
+        ])
+        if sign < 0:
+            connection.execute(delete(model).where(model.grades_count <= 0))
+
+
+def rebuild_grade_stats_sync(connection: Connection) -> None:
+    for model, key_columns in GRADE_STATS_KEYS.items():
+        keys = [getattr(StudentGrade, c) for c in key_columns]
+        query = (
+            select(*keys, func.sum(StudentGrade.grade_value), func.count())
+            .select_from(StudentGrade)
+            .having(func.count() > 0)
         )
+        if keys:
+            query = query.group_by(*keys)
+        else:
+            query = query.add_columns(literal(1))
+        connection.execute(delete(model))
+        connection.execute(insert(model).from_select(
+            [*key_columns, "grades_sum", "grades_count", *(() if keys else ("id",))],
+            query,
+        ))
+
+
+async def rebuild_grade_stats() -> None:
+    async with get_engine().begin() as conn:
+        await conn.run_sync(rebuild_grade_stats_sync)
+
+
+def cascaded_grade_stats_rows(
+        connection: Connection, model: Base, criteria: list[Any],
+        exclude_ids: Sequence[int] = (),
+) -> list[Row]:
+    """
+    (student_id, subject_id, grade_id, count) of the StudentGrade rows deleted
+    by ON DELETE CASCADE together with the `model` rows matching `criteria`.
+    """
+    if model is StudentGrade:
+        condition = and_(*criteria)
+    else:
+        columns = [
+            fk.parent for fk in StudentGrade.__table__.foreign_keys
+            if fk.column.table is model.__table__
+        ]
+        if not columns:
+            return []
+        condition = columns[0].in_(select(model.id).where(*criteria))
+    if exclude_ids:
+        condition = and_(condition, StudentGrade.id.not_in(exclude_ids))
+    keys = (StudentGrade.student_id, StudentGrade.subject_id, StudentGrade.grade_id)
+    return connection.execute(
+        select(*keys, func.count()).where(condition).group_by(*keys)
+    ).all()
+
+
+def cascade_tables(model: Base) -> list[str]:
+    """Name of the model table and of the tables its deletes cascade to."""
+    return [model.__table__.name] + [
+        table.name for table in Base.metadata.sorted_tables
+        if any(fk.column.table is model.__table__ for fk in table.foreign_keys)
+    ]
+
+
+def _grade_stats_rows(objects: Iterable[Any]) -> list[tuple[int, int, int]]:
+    return [
+        (obj.student_id, obj.subject_id, obj.grade_id)
+        for obj in objects if isinstance(obj, StudentGrade)
+    ]
+
+
+@event.listens_for(Session, "before_flush")
+def _grade_stats_before_flush(session: Session, flush_context, instances) -> None:
+    # Deleted grades are subtracted before the flush, while their grade rows
+    # (which can be deleted in the same flush) still exist.
+    deleted = _grade_stats_rows(session.deleted)
+    if deleted:
+        apply_grade_stats(session.connection(), deleted, sign=-1)
+    # Grades of deleted students, grades and subjects are removed by the DB
+    # (passive_deletes), unless they are loaded and deleted above.
+    deleted_ids = [obj.id for obj in session.deleted if isinstance(obj, StudentGrade)]
+    for obj in session.deleted:
+        if isinstance(obj, (Student, Grade, Subject)):
+            model = type(obj)
+            apply_grade_stats(
+                session.connection(),
+                cascaded_grade_stats_rows(
+                    session.connection(), model, [model.id == obj.id], deleted_ids
+                ),
+                sign=-1,
+            )
+    for obj in session.dirty:
+        if isinstance(obj, Grade) and inspect(obj).attrs.value.history.has_changes():
+            session.info.setdefault("changed_grade_values", set()).add(obj.id)
+
+    new_grades = [
+        obj for obj in session.new
+        if isinstance(obj, StudentGrade) and obj.grade_value is None
+    ]
+    if new_grades:
+        values = grade_values(session.connection())
+        for obj in new_grades:
+            obj.grade_value = (
+                obj.grade.value if obj.grade is not None else values.get(obj.grade_id)
+            )
+
+
+@event.listens_for(Session, "after_flush")
+def _grade_stats_after_flush(session: Session, flush_context) -> None:
+    new = _grade_stats_rows(session.new)
+    if new:
+        apply_grade_stats(session.connection(), new, sign=1)
+    changed_grade_values = session.info.pop("changed_grade_values", None)
+    if changed_grade_values:
+        sync_grade_values(session.connection(), changed_grade_values)
+        rebuild_grade_stats_sync(session.connection())
+
+
+@event.listens_for(Session, "after_flush")
+def _track_written_tables(session: Session, flush_context) -> None:
+    tables = session.info.setdefault("written_tables", set())
+    for obj in chain(session.new, session.dirty):
+        tables.add(obj.__table__.name)
+    for obj in session.deleted:
+        tables.update(cascade_tables(type(obj)))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_written_tables(session: Session) -> None:
+    tables = session.info.pop("written_tables", ())
+    report_cache.invalidate(tables)
+    dimensions.invalidate(tables)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_written_tables(session: Session) -> None:
+    session.info.pop("written_tables", None)
+
+
+async def find_all_rows(
+        model: Base, limit: int = None, after_id: int = None
+) -> list[dict]:
+    """
+    Rows are ordered by id. `limit` and `after_id` give a keyset page: at most
+    `limit` rows with id greater than `after_id`.
+    """
+    query = select(model).order_by(model.id)
+    if after_id is not None:
+        query = query.where(model.id > after_id)
+    if limit is not None:
+        query = query.limit(limit)
+    async with AsyncReadSession() as session:
+        rows = await session.execute(query)
         rows = rows.all()
         formatted_rows = []
         inst = inspect(model)
@@ -160,6 +495,23 @@ async def find_all_rows(model: Base) -> list[dict]:
         return formatted_rows
 
 
+async def stream_rows(
+        model: Base, chunk_size: int = 1000
+) -> AsyncIterator[list[dict]]:
+    """
+    Yields the rows of `model` as chunks of plain dicts read through a
+    server-side cursor, without loading ORM instances into the session.
+    """
+    async with AsyncReadSession() as session:
+        rows = await session.stream(
+            select(*model.__table__.columns)
+            .order_by(model.id)
+            .execution_options(yield_per=chunk_size)
+        )
+        async for chunk in rows.mappings().partitions():
+            yield [dict(row) for row in chunk]
+
+
 async def get_row_by_id(model: Base, row_id: int) -> Base:
     async with AsyncDBSession() as session:
         row = await session.execute(
@@ -169,17 +521,53 @@ async def get_row_by_id(model: Base, row_id: int) -> Base:
         return row
 
 
+def delete_rows_sync(connection: Connection, model: Base, criteria: list[Any]) -> int:
+    apply_grade_stats(
+        connection, cascaded_grade_stats_rows(connection, model, criteria), sign=-1
+    )
+    return connection.execute(delete(model).where(*criteria)).rowcount
+
+
+def delete_rows_criteria(
+        model: Base, ids: Iterable[int] = None, filters: dict[str, Any] = None
+) -> list[Any]:
+    criteria = []
+    if ids is not None:
+        criteria.append(model.id.in_(read_ids(ids)))
+    for name, value in (filters or {}).items():
+        if name not in model.__table__.columns:
+            raise Exception(f"Column '{name}' doesn't exist in the table "
+                            f"'{model.__table__}'")
+        criteria.append(model.__table__.columns[name] == value)
+    if not criteria:
+        raise Exception("ids or filters are required to delete rows")
+    return criteria
+
+
+async def delete_rows(
+        model: Base, ids: Iterable[int] = None, filters: dict[str, Any] = None
+) -> int:
+    """
+    Deletes the rows with the given ids and/or matching all `filters`
+    (column name -> value) in one DELETE. Child rows are removed by the
+    ON DELETE CASCADE foreign keys, the grade stats are updated in the same
+    transaction. Returns the number of deleted rows.
+    """
+    criteria = delete_rows_criteria(model, ids, filters)
+    async with get_engine().begin() as conn:
+        deleted = await conn.run_sync(delete_rows_sync, model, criteria)
+    if deleted:
+        report_cache.invalidate(cascade_tables(model))
+        dimensions.invalidate(cascade_tables(model))
+    return deleted
+
+
 async def delete_db_row_by_id(model: Base, row_id: int) -> bool:
-    async with AsyncDBSession() as session:
-        row = await get_row_by_id(model=model, row_id=row_id)
-        if row:
-            await session.delete(row)
-            await session.commit()
-            return True
-        else:
-            logging.info(f"Row with id '{row_id}' doesn't exist in the table "
-                         f"'{model.__table__}'")
-            return False
+    if await delete_rows(model, ids=[row_id]):
+        return True
+    logging.info(f"Row with id '{row_id}' doesn't exist in the table "
+                 f"'{model.__table__}'")
+    return False
 
 
 async def find_teacher_by_name(full_name: str) -> Teacher:
@@ -190,21 +578,21 @@ async def find_teacher_by_name(full_name: str) -> Teacher:
                 and_(Teacher.first_name == first_name, Teacher.last_name == last_name)
             )
         )
-        teacher = teacher.one_or_none()
+        teacher = teacher.scalar_one_or_none()
         return teacher
 
 
 async def find_grade_by_code(grade_code: str) -> Grade:
     async with AsyncDBSession() as session:
         grade = await session.execute(select(Grade).where(Grade.code == grade_code))
-        grade = grade.one_or_none()
+        grade = grade.scalar_one_or_none()
         return grade
 
 
 async def find_group_by_name(group_name: str) -> Group:
     async with AsyncDBSession() as session:
         group = await session.execute(select(Group).where(Group.code == group_name))
-        group = group.one_or_none()
+        group = group.scalar_one_or_none()
         return group
 
 
@@ -213,7 +601,7 @@ async def find_subject_by_name(subject_name: SUBJECT) -> Subject:
         subject = await session.execute(
             select(Subject).where(Subject.name == subject_name)
         )
-        subject = subject.one_or_none()
+        subject = subject.scalar_one_or_none()
         return subject
 
 
@@ -225,10 +613,152 @@ async def find_student_by_name(full_name: str) -> Student:
                 and_(Student.first_name == first_name, Student.last_name == last_name)
             )
         )
-        student = student.one_or_none()
+        student = student.scalar_one_or_none()
         return student
 
 
+async def get_students_ids() -> dict[tuple[str, str], int]:
+    async with AsyncDBSession() as session:
+        rows = await session.execute(
+            select(Student.first_name, Student.last_name, Student.id)
+            .order_by(Student.id)
+        )
+        students_ids = {}
+        for first_name, last_name, _id in rows:
+            students_ids.setdefault((first_name, last_name), _id)
+        return students_ids
+
+
+class Dimensions:
+    """
+    In-process lookup of grade codes, subject names and group codes to ids.
+    The three tables are small, so they are loaded together in one query on
+    first use and reloaded after any write to one of them in this process, or
+    when a key the caller needs isn't found (it may be written by another one).
+    """
+    tables = (Grade.__tablename__, Subject.__tablename__, Group.__tablename__)
+
+    def __init__(self):
+        self.grades: dict[str, int] = {}
+        self.subjects: dict[str, int] = {}
+        self.groups: dict[str, int] = {}
+        self.is_loaded = False
+
+    def _missing(self, keys: dict[str, Iterable[str]]) -> bool:
+        return any(
+            key not in getattr(self, lookup)
+            for lookup, lookup_keys in keys.items() for key in lookup_keys
+        )
+
+    async def load(
+            self, session: AsyncSession = None, **keys: Iterable[str]
+    ) -> Dimensions:
+        """
+        `keys` are the grades, subjects and groups the caller looks up, e.g.
+        `load(subjects=["MATH"])`, a missing one reloads the tables once.
+        """
+        if self.is_loaded and not self._missing(keys):
+            return self
+        query = union_all(
+            select(literal(Grade.__tablename__), Grade.code, Grade.id),
+            select(literal(Subject.__tablename__), Subject.name, Subject.id),
+            select(literal(Group.__tablename__), Group.code, Group.id),
+        )
+        if session is None:
+            async with AsyncDBSession() as session:
+                rows = await session.execute(query)
+        else:
+            rows = await session.execute(query)
+        lookups = {table: {} for table in self.tables}
+        for table, key, _id in sorted(rows, key=lambda row: row[2]):
+            lookups[table].setdefault(key, _id)
+        self.grades = lookups[Grade.__tablename__]
+        self.subjects = lookups[Subject.__tablename__]
+        self.groups = lookups[Group.__tablename__]
+        self.is_loaded = True
+        return self
+
+    def invalidate(self, tables: Iterable[str]) -> None:
+        if set(tables) & set(self.tables):
+            self.is_loaded = False
+
+
+dimensions = Dimensions()
+
+
+async def get_grades_ids() -> dict[str, int]:
+    return (await dimensions.load()).grades
+
+
+async def get_subjects_ids() -> dict[str, int]:
+    return (await dimensions.load()).subjects
+
+
+async def get_groups_ids() -> dict[str, int]:
+    return (await dimensions.load()).groups
+
+
+def _lookup_id(lookup: dict[str, int], key: str, name: str) -> int:
+    if key not in lookup:
+        raise Exception(f"{name} '{key}' doesn't exist in DB")
+    return lookup[key]
+
+
+def read_ids(ids: int | Iterable[int]) -> list[int]:
+    # A str is iterable too, '12' mustn't become the ids '1' and '2'
+    if isinstance(ids, (str, bytes)):
+        raise Exception(f"Ids should be integers, got {ids!r}")
+    ids = [ids] if isinstance(ids, int) else list(ids)
+    if not all(isinstance(_id, int) and not isinstance(_id, bool) for _id in ids):
+        raise Exception(f"Ids should be integers, got {ids!r}")
+    return ids
+
+
+def update_rows_query(
+        model: Base, ids: int | Iterable[int], values: dict[str, Any]
+) -> Any:
+    # UPDATE ... RETURNING of the not None values, None if there is nothing to do
+    ids = read_ids(ids)
+    values = {key: value for key, value in values.items() if value is not None}
+    if not ids or not values:
+        return None
+    if "updated_at" in model.__table__.columns:
+        values["updated_at"] = datetime.now()
+    return (
+        update(model)
+        .where(model.id.in_(ids))
+        .values(**values)
+        .returning(*model.__table__.columns)
+    )
+
+
+async def update_rows(
+        model: Base, ids: int | Iterable[int], **values: Any
+) -> list[Row]:
+    """
+    Updates the rows with the given id(s) in a single UPDATE ... RETURNING.
+    Only the values that are not None are written. Returns the updated rows.
+    """
+    query = update_rows_query(model, ids, values)
+    if query is None:
+        return []
+    async with get_engine().begin() as conn:
+        result = await conn.execute(query)
+        rows = result.all()
+        tables = [model.__table__.name]
+        if model is Grade and values.get("value") is not None and rows:
+            await conn.run_sync(sync_grade_values, [row.id for row in rows])
+            await conn.run_sync(rebuild_grade_stats_sync)
+            tables.append(StudentGrade.__tablename__)
+    if not rows:
+        logging.info(f"Rows with ids {ids} don't exist in the table "
+                     f"'{model.__table__}'")
+        return rows
+    report_cache.invalidate(tables)
+    dimensions.invalidate(tables)
+    return rows
+
+
 async def create_teacher(
         first_name: str, last_name: str, gender: GENDER | str, birthdate: str = None
 ):
@@ -244,17 +774,12 @@ async def create_teacher(
 
 
 async def update_teacher(
-        _id: int, first_name: str = None, last_name: str = None,
-        gender: GENDER | str = None, birthdate: str = None):
-    teacher = await get_row_by_id(model=Teacher, row_id=_id)
-    teacher.first_name = first_name if first_name else teacher.first_name
-    teacher.last_name = last_name if first_name else teacher.last_name
-    teacher.gender = gender if gender else teacher.gender
-    teacher.birthdate = birthdate if birthdate else teacher.birthdate
-    async with AsyncDBSession() as session:
-        async with session.begin():
-            session.add(teacher)
-            await session.commit()
+        _id: int | Iterable[int], first_name: str = None, last_name: str = None,
+        gender: GENDER | str = None, birthdate: str = None) -> list[Row]:
+    return await update_rows(
+        Teacher, _id, first_name=first_name, last_name=last_name, gender=gender,
+        birthdate=birthdate,
+    )
 
 
 async def create_student(
@@ -272,17 +797,12 @@ async def create_student(
 
 
 async def update_student(
-        _id: int, first_name: str = None, last_name: str = None,
-        gender: GENDER | str = None, birthdate: str = None):
-    student = await get_row_by_id(model=Student, row_id=_id)
-    student.first_name = first_name if first_name else student.first_name
-    student.last_name = last_name if first_name else student.last_name
-    student.gender = gender if gender else student.gender
-    student.birthdate = birthdate if birthdate else student.birthdate
-    async with AsyncDBSession() as session:
-        async with session.begin():
-            session.add(student)
-            await session.commit()
+        _id: int | Iterable[int], first_name: str = None, last_name: str = None,
+        gender: GENDER | str = None, birthdate: str = None) -> list[Row]:
+    return await update_rows(
+        Student, _id, first_name=first_name, last_name=last_name, gender=gender,
+        birthdate=birthdate,
+    )
 
 
 async def create_group(name: str, code: str):
@@ -296,14 +816,9 @@ async def create_group(name: str, code: str):
 
 
 async def update_group(
-        _id: int, name: str = None, code: str = None):
-    group = await get_row_by_id(model=Group, row_id=_id)
-    group.name = name if name else group.name
-    group.code = code if code else group.code
-    async with AsyncDBSession() as session:
-        async with session.begin():
-            session.add(group)
-            await session.commit()
+        _id: int | Iterable[int], name: str = None, code: str = None
+) -> list[Row]:
+    return await update_rows(Group, _id, name=name, code=code)
 
 
 async def create_grade(value: str, code: str):
@@ -317,14 +832,9 @@ async def create_grade(value: str, code: str):
 
 
 async def update_grade(
-        _id: int, value: str = None, code: str = None):
-    grade = await get_row_by_id(model=Grade, row_id=_id)
-    grade.value = value if value else grade.name
-    grade.code = code if code else grade.code
-    async with AsyncDBSession() as session:
-        async with session.begin():
-            session.add(grade)
-            await session.commit()
+        _id: int | Iterable[int], value: str = None, code: str = None
+) -> list[Row]:
+    return await update_rows(Grade, _id, value=value, code=code)
 
 
 async def create_subject(name: str, description: str):
@@ -338,33 +848,86 @@ async def create_subject(name: str, description: str):
 
 
 async def update_subject(
-        _id: int, name: str = None, description: str = None):
-    subject = await get_row_by_id(model=Subject, row_id=_id)
-    subject.name = name if name else subject.name
-    subject.description = description if description else subject.description
+        _id: int | Iterable[int], name: str = None, description: str = None
+) -> list[Row]:
+    return await update_rows(Subject, _id, name=name, description=description)
+
+
+async def get_people_ids(
+        model: Base, names: Iterable[str]
+) -> dict[str, int]:
+    # Full name -> id of the teachers or students with the given names
+    keys = defaultdict(set)
+    for name in names:
+        if isinstance(name, str) and len(name.split()) == 2:
+            keys[tuple(name.split())].add(name)
+    if not keys:
+        return {}
     async with AsyncDBSession() as session:
-        async with session.begin():
-            session.add(subject)
-            await session.commit()
-
-
-async def create_teacher_subject(teacher_name: str, subject_name: SUBJECT):
-    teacher_id = find_teacher_by_name(full_name=teacher_name).id
-    subject_id = find_subject_by_name(subject_name=subject_name).id
-    async with AsyncDBSession() as session:
-        async with session.begin():
-            teacher_subject = TeacherSubject(
-                teacher_id=teacher_id,
-                subject_id=subject_id,
-            )
-            session.add(teacher_subject)
+        rows = await session.execute(
+            select(model.first_name, model.last_name, model.id)
+            .where(tuple_(model.first_name, model.last_name).in_(list(keys)))
+            .order_by(model.id)
+        )
+        people_ids = {}
+        for first_name, last_name, _id in rows:
+            for name in keys[(first_name, last_name)]:
+                people_ids.setdefault(name, _id)
+        return people_ids
+
+
+async def insert_links(model: Base, rows: list[dict], batch_size: int = 5000) -> int:
+    """
+    Multi-row INSERT ... ON CONFLICT DO NOTHING of link rows (TeacherSubject,
+    StudentGroup) in one transaction. Returns the number of new rows, the
+    ones already in the table are skipped.
+    """
+    # Duplicates within `rows` would be skipped by the DB as well
+    rows = list({tuple(row[c] for c in LINK_UNIQUE_KEYS[model]): row
+                 for row in rows}.values())
+    inserted = 0
+    async with get_engine().begin() as conn:
+        for batch in _batched(rows, batch_size):
+            result = await conn.execute(insert_ignore(conn, model).values(batch))
+            inserted += result.rowcount
+    if rows:
+        report_cache.invalidate([model.__tablename__])
+    return inserted
+
+
+async def create_teachers_subjects(records: list[tuple[str, SUBJECT]]) -> int:
+    """
+    Links every (teacher name, subject name) of `records`, the links that
+    already exist are skipped. Returns the number of new links.
+    """
+    teachers_ids = await get_people_ids(Teacher, [name for name, _ in records])
+    subjects_ids = (await dimensions.load(
+        subjects=[subject_name for _, subject_name in records]
+    )).subjects
+    rows = [
+        {
+            "teacher_id": _lookup_id(teachers_ids, teacher_name, "Teacher"),
+            "subject_id": _lookup_id(subjects_ids, subject_name, "Subject"),
+        }
+        for teacher_name, subject_name in records
+    ]
+    return await insert_links(TeacherSubject, rows)
+
+
+async def create_teacher_subject(teacher_name: str, subject_name: SUBJECT) -> bool:
+    # False when the teacher already teaches the subject
+    return bool(await create_teachers_subjects([(teacher_name, subject_name)]))
 
 
 async def create_student_grade(grade_code: str, student_name: str, subject_name:
 SUBJECT):
-    student_id = find_teacher_by_name(full_name=student_name).id
-    grade_id = find_grade_by_code(grade_code=grade_code).id
-    subject_id = find_subject_by_name(subject_name=subject_name).id
+    student = await find_student_by_name(full_name=student_name)
+    if not student:
+        raise Exception(f"Student '{student_name}' doesn't exist in DB")
+    student_id = student.id
+    dims = await dimensions.load(grades=[grade_code], subjects=[subject_name])
+    grade_id = _lookup_id(dims.grades, grade_code, "Grade")
+    subject_id = _lookup_id(dims.subjects, subject_name, "Subject")
     async with AsyncDBSession() as session:
         async with session.begin():
             teacher_subject = StudentGrade(
@@ -373,15 +936,88 @@ SUBJECT):
             session.add(teacher_subject)
 
 
-async def create_student_group(student_name: str, group_name: str):
-    student_id = find_teacher_by_name(full_name=student_name).id
-    group_id = find_group_by_name(group_name=group_name).id
-    async with AsyncDBSession() as session:
-        async with session.begin():
-            student_group = StudentGroup(
-                student_id=student_id, group_id=group_id
-            )
-            session.add(student_group)
+async def create_student_grades_bulk(records: list[dict]) -> list[dict]:
+    """
+    Records have the same keys as the `create_student_grade` arguments. All
+    student names are resolved with one query and grade codes and subjects
+    through `dimensions`, then every valid record is written with a single
+    multi-row INSERT in one transaction. Returns an outcome per record:
+    {"record": ..., "status": "created" | "rejected", "reason": ...}.
+    """
+    students_ids = await get_people_ids(
+        Student, [record.get("student_name") for record in records]
+    )
+    # Records without a grade or subject are rejected, they don't reload
+    dims = await dimensions.load(
+        grades=[record["grade_code"] for record in records
+                if record.get("grade_code") is not None],
+        subjects=[record["subject_name"] for record in records
+                  if record.get("subject_name") is not None],
+    )
+
+    outcomes, new_rows = [], []
+    for record in records:
+        student_id = students_ids.get(record.get("student_name"))
+        grade_id = dims.grades.get(record.get("grade_code"))
+        subject_id = dims.subjects.get(record.get("subject_name"))
+        if student_id is None:
+            reason = f"Student '{record.get('student_name')}' doesn't exist in DB"
+        elif grade_id is None:
+            reason = f"Grade '{record.get('grade_code')}' doesn't exist in DB"
+        elif subject_id is None:
+            reason = f"Subject '{record.get('subject_name')}' doesn't exist in DB"
+        else:
+            reason = None
+            new_rows.append({
+                "student_id": student_id, "grade_id": grade_id,
+                "subject_id": subject_id, "created_at": datetime.now(),
+            })
+        outcomes.append({
+            "record": record,
+            "status": "rejected" if reason else "created",
+            "reason": reason,
+        })
+
+    if new_rows:
+        async with AsyncDBSession() as session:
+            async with session.begin():
+                conn = await session.connection()
+                await conn.run_sync(fill_grade_values, new_rows)
+                await session.execute(insert(StudentGrade).values(new_rows))
+                await conn.run_sync(
+                    apply_grade_stats,
+                    [(r["student_id"], r["subject_id"], r["grade_id"])
+                     for r in new_rows],
+                    1,
+                )
+                session.info.setdefault("written_tables", set()).add(
+                    StudentGrade.__tablename__
+                )
+    return outcomes
+
+
+async def create_students_groups(records: list[tuple[str, str]]) -> int:
+    """
+    Adds every (student name, group code) of `records`, the students already
+    in the group are skipped. Returns the number of new rows.
+    """
+    students_ids = await get_people_ids(Student, [name for name, _ in records])
+    groups_ids = (await dimensions.load(
+        groups=[group_name for _, group_name in records]
+    )).groups
+    rows = [
+        {
+            "student_id": _lookup_id(students_ids, student_name, "Student"),
+            "group_id": _lookup_id(groups_ids, group_name, "Group"),
+        }
+        for student_name, group_name in records
+    ]
+    return await insert_links(StudentGroup, rows)
+
+
+async def create_student_group(student_name: str, group_name: str) -> bool:
+    # False when the student is already in the group
+    return bool(await create_students_groups([(student_name, group_name)]))
 
 
 async def insert_objects(rows: list[Any]) -> None:
@@ -390,11 +1026,97 @@ async def insert_objects(rows: list[Any]) -> None:
             session.add_all(rows)
 
 
+def _batched(rows: Sequence[Any], batch_size: int):
+    for start in range(0, len(rows), batch_size):
+        yield rows[start:start + batch_size]
+
+
+def fill_column_defaults(model: Base, rows: list[dict]) -> None:
+    # COPY doesn't run the Python-side defaults (created_at=datetime.now, ...)
+    defaults = {}
+    for column in model.__table__.columns:
+        default = column.default
+        if default is None or column.primary_key:
+            continue
+        defaults[column.name] = default.arg(None) if default.is_callable else default.arg
+    for row in rows:
+        for name, value in defaults.items():
+            row.setdefault(name, value)
+
+
+def _is_asyncpg() -> bool:
+    dialect = get_engine().dialect
+    return dialect.name == "postgresql" and dialect.driver == "asyncpg"
+
+
+async def insert_rows(
+        model: Base, rows: list[dict], batch_size: int = 5000
+) -> int:
+    """
+    Bulk insert of plain dict rows bypassing the ORM unit of work. Rows are
+    written with multi-row INSERT (executemany) in batches of `batch_size`, or
+    with a single COPY when the engine uses asyncpg. Link rows go through
+    `insert_links`, so the ones already in the table are skipped and not counted.
+    """
+    if not rows:
+        return 0
+    if model in LINK_UNIQUE_KEYS:
+        return await insert_links(model, rows, batch_size)
+    table = model.__table__
+    async with get_engine().begin() as conn:
+        if model is StudentGrade:
+            await conn.run_sync(fill_grade_values, rows)
+        if _is_asyncpg():
+            fill_column_defaults(model, rows)
+            columns = list(rows[0].keys())
+            raw_conn = await conn.get_raw_connection()
+            await raw_conn.driver_connection.copy_records_to_table(
+                table.name,
+                records=[tuple(row[c] for c in columns) for row in rows],
+                columns=columns,
+            )
+        else:
+            for batch in _batched(rows, batch_size):
+                await conn.execute(insert(table), batch)
+        if model is StudentGrade:
+            await conn.run_sync(
+                apply_grade_stats,
+                [(row["student_id"], row["subject_id"], row["grade_id"])
+                 for row in rows],
+                1,
+            )
+    report_cache.invalidate([table.name])
+    dimensions.invalidate([table.name])
+    return len(rows)
+
+
+def stamp_head(connection: Connection) -> None:
+    # create_all builds the schema of the latest revision, alembic starts there
+    from alembic.config import Config
+    from alembic.runtime.migration import MigrationContext
+    from alembic.script import ScriptDirectory
+
+    config = Config(os.path.join(os.path.dirname(__file__), "alembic.ini"))
+    config.set_main_option(
+        "script_location", os.path.join(os.path.dirname(__file__), "alembic")
+    )
+    MigrationContext.configure(connection).stamp(
+        ScriptDirectory.from_config(config), "head"
+    )
+
+
 async def init_models():
-    async with engine.begin() as conn:
+    async with get_engine().begin() as conn:
         await conn.run_sync(Base.metadata.drop_all)
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(stamp_head)
 
 
 if __name__ == "__main__":
-    asyncio.run(init_models())
+    parser = argparse.ArgumentParser(description="Create or maintain DB tables")
+    parser.add_argument("--rebuild-stats", action="store_true",
+                        help="recalculate the grade stats tables")
+    if parser.parse_args().rebuild_stats:
+        asyncio.run(rebuild_grade_stats())
+    else:
+        asyncio.run(init_models())
@@ -1,8 +1,14 @@
 import asyncio
+import base64
+import json
 from pprint import pprint
+from typing import NamedTuple, Callable, Sequence
 
-from sqlalchemy import select, func, desc, and_
+from sqlalchemy import (
+    select, func, desc, and_, tuple_, literal, Select, Row, ColumnElement
+)
 
+from cache import cached_report
 from models import (
     Student,
     Group,
@@ -12,239 +18,460 @@ from models import (
     Teacher,
     TeacherSubject,
     Subject,
-    AsyncDBSession,
+    StudentGradeStats,
+    StudentSubjectGradeStats,
+    SubjectGradeStats,
+    GradeStats,
+    AsyncReadSession,
 )
 
 
+def stats_avg(stats: type) -> ColumnElement:
+    return func.round(stats.grades_sum / stats.grades_count, 2)
+
+
+def select_1_query() -> Select:
+    return (
+        select(
+            stats_avg(StudentGradeStats),
+            StudentGradeStats.student_id,
+            Student.first_name,
+            Student.last_name,
+        )
+        .join(Student, Student.id == StudentGradeStats.student_id)
+        .order_by(desc(stats_avg(StudentGradeStats)))
+        .limit(5)
+    )
+
+
+@cached_report(StudentGrade, Grade, Student)
 async def select_1():
     # Знайти 5 студентів із найбільшим середнім балом з усіх предметів.
-    async with AsyncDBSession() as session:
-        students = await session.execute(
-            select(
-                func.round(func.avg(Grade.value), 2),
-                StudentGrade.student_id,
-                Student.first_name,
-                Student.last_name,
-            )
-            .join(StudentGrade, StudentGrade.grade_id == Grade.id)
-            .join(Student, Student.id == StudentGrade.student_id)
-            .group_by(StudentGrade.student_id)
-            .group_by(Student.first_name)
-            .group_by(Student.last_name)
-            .order_by(desc(func.round(func.avg(Grade.value), 2)))
-            .limit(5)
-        )
+    async with AsyncReadSession() as session:
+        students = await session.execute(select_1_query())
         students = students.all()
         return students
 
 
+def select_2_query(subject_name: str) -> Select:
+    return (
+        select(
+            stats_avg(StudentSubjectGradeStats),
+            StudentSubjectGradeStats.student_id,
+            Student.first_name,
+            Student.last_name,
+        )
+        .join(Student, Student.id == StudentSubjectGradeStats.student_id)
+        .join(Subject, Subject.id == StudentSubjectGradeStats.subject_id)
+        .where(Subject.name == subject_name)
+        .order_by(desc(stats_avg(StudentSubjectGradeStats)))
+        .limit(1)
+    )
+
+
+@cached_report(StudentGrade, Grade, Student, Subject)
 async def select_2(subject_name: str):
     # Знайти студента із найвищим середнім балом з певного предмета.
-    async with AsyncDBSession() as session:
-        students = await session.execute(
-            select(
-                func.round(func.avg(Grade.value), 2),
-                StudentGrade.student_id,
-                Student.first_name,
-                Student.last_name,
-            )
-            .join(StudentGrade, StudentGrade.grade_id == Grade.id)
-            .join(Student, Student.id == StudentGrade.student_id)
-            .join(Subject, Subject.id == StudentGrade.subject_id)
-            .where(Subject.name == subject_name)
-            .group_by(StudentGrade.student_id)
-            .group_by(Student.first_name)
-            .group_by(Student.last_name)
-            .order_by(desc(func.round(func.avg(Grade.value), 2)))
-            .limit(1)
-        )
+    async with AsyncReadSession() as session:
+        students = await session.execute(select_2_query(subject_name))
         students = students.one_or_none()
         return students
 
 
+def select_3_query(subject_name: str) -> Select:
+    return (
+        select(
+            stats_avg(SubjectGradeStats),
+            Subject.name
+        )
+        .join(Subject, Subject.id == SubjectGradeStats.subject_id)
+        .where(Subject.name == subject_name)
+    )
+
+
+@cached_report(StudentGrade, Grade, Subject)
 async def select_3(subject_name: str):
     # Знайти середній бал у групах з певного предмета.
-    async with AsyncDBSession() as session:
-        grades = await session.execute(
-            select(
-                func.round(func.avg(Grade.value), 2),
-                Subject.name
-            )
-            .join(StudentGrade, StudentGrade.grade_id == Grade.id)
-            .join(Student, Student.id == StudentGrade.student_id)
-            .join(Subject, Subject.id == StudentGrade.subject_id)
-            .where(Subject.name == subject_name)
-            .group_by(Subject.name)
-        )
+    async with AsyncReadSession() as session:
+        grades = await session.execute(select_3_query(subject_name))
         avg_grades = grades.all()
         return avg_grades
 
+def select_4_query() -> Select:
+    return select(stats_avg(GradeStats))
+
+
+@cached_report(StudentGrade, Grade)
 async def select_4():
     # Знайти середній бал на потоці (по всій таблиці оцінок).
-    async with AsyncDBSession() as session:
-        grades = await session.execute(
-            select(
-                func.round(func.avg(Grade.value), 2)
-            )
-            .join(StudentGrade, StudentGrade.grade_id == Grade.id)
-            .join(Subject, Subject.id == StudentGrade.subject_id)
-        )
+    async with AsyncReadSession() as session:
+        grades = await session.execute(select_4_query())
         avg_grades = grades.one_or_none()
         return avg_grades
 
+def select_5_query(teacher_id: int) -> Select:
+    return (
+        select(
+            Subject.name, Teacher.first_name, Teacher.last_name
+        )
+        .join(TeacherSubject, TeacherSubject.subject_id == Subject.id)
+        .join(Teacher, Teacher.id == TeacherSubject.teacher_id)
+        .where(Teacher.id == teacher_id)
+    )
+
+
+@cached_report(Subject, TeacherSubject, Teacher)
 async def select_5(teacher_id: int):
     # Знайти які курси читає певний викладач.
-    async with AsyncDBSession() as session:
-        teachers_subjects = await session.execute(
-            select(
-                Subject.name, Teacher.first_name, Teacher.last_name
-            )
-            .join(TeacherSubject, TeacherSubject.subject_id == Subject.id)
-            .join(Teacher, Teacher.id == TeacherSubject.teacher_id)
-            .where(Teacher.id == teacher_id)
-        )
+    async with AsyncReadSession() as session:
+        teachers_subjects = await session.execute(select_5_query(teacher_id))
         teachers_subjects = teachers_subjects.all()
         return teachers_subjects
 
 
+def select_6_query(group_code: str) -> Select:
+    return (
+        select(
+            Group.name, Group.code, Student.first_name, Student.last_name
+        )
+        .join(StudentGroup, StudentGroup.group_id == Group.id)
+        .join(Student, Student.id == StudentGroup.student_id)
+        .where(Group.code == group_code)
+    )
+
+
+@cached_report(Group, StudentGroup, Student)
 async def select_6(group_code: str):
     # Знайти список студентів у певній групі.
-    async with AsyncDBSession() as session:
-        students = await session.execute(
-            select(
-                Group.name, Group.code, Student.first_name, Student.last_name
-            )
-            .join(StudentGroup, StudentGroup.group_id == Group.id)
-            .join(Student, Student.id == StudentGroup.student_id)
-            .where(Group.code == group_code)
-        )
+    async with AsyncReadSession() as session:
+        students = await session.execute(select_6_query(group_code))
         students = students.all()
         return students
 
+def select_7_query(group_code: str, subject_name: str) -> Select:
+    return (
+        select(
+            Student.first_name, Student.last_name, StudentGrade.grade_value,
+            Group.code.label("group_code"), Subject.name.label("subject_name")
+        )
+        .join(StudentGrade, Student.id == StudentGrade.student_id)
+        .join(StudentGroup, Student.id == StudentGroup.student_id)
+        .join(Group, Group.id == StudentGroup.group_id)
+        .join(Subject, Subject.id == StudentGrade.subject_id)
+        .where(and_(Group.code == group_code, Subject.name == subject_name))
+    )
+
+
+@cached_report(Student, StudentGrade, StudentGroup, Group, Subject, Grade)
 async def select_7(group_code: str, subject_name: str):
     # Знайти оцінки студентів у окремій групі з певного предмета.
-    async with AsyncDBSession() as session:
-        grades = await session.execute(
-            select(
-                Student.first_name, Student.last_name, Grade.value.label("grade_value"),
-                Group.code.label("group_code"), Subject.name.label("subject_name")
-            )
-            .join(StudentGrade, Student.id == StudentGrade.student_id)
-            .join(StudentGroup, Student.id == StudentGroup.student_id)
-            .join(Group, Group.id == StudentGroup.group_id)
-            .join(Subject, Subject.id == StudentGrade.subject_id)
-            .join(Grade, Grade.id == StudentGrade.grade_id)
-            .where(and_(Group.code == group_code, Subject.name == subject_name))
-        )
+    async with AsyncReadSession() as session:
+        grades = await session.execute(select_7_query(group_code, subject_name))
         grades = grades.all()
         return grades
 
+def select_8_query() -> Select:
+    return (
+        select(
+            func.round(func.avg(StudentGrade.grade_value), 2).label("avg_grade"),
+            Teacher.first_name, Teacher.last_name
+        )
+        .select_from(StudentGrade)
+        .join(TeacherSubject, TeacherSubject.subject_id == StudentGrade.subject_id)
+        .join(Teacher, Teacher.id == TeacherSubject.teacher_id)
+        .group_by(Teacher.first_name)
+        .group_by(Teacher.last_name)
+    )
+
+
+@cached_report(Grade, StudentGrade, TeacherSubject, Teacher)
 async def select_8():
     # Знайти середній бал, який ставить певний викладач зі своїх предметів.
-    async with AsyncDBSession() as session:
-        avg_grades = await session.execute(
-            select(
-                func.round(func.avg(Grade.value), 2).label("avg_grade"),
-                Teacher.first_name, Teacher.last_name
-            )
-            .join(StudentGrade, Grade.id == StudentGrade.grade_id)
-            .join(TeacherSubject, TeacherSubject.subject_id == StudentGrade.subject_id)
-            .join(Teacher, Teacher.id == TeacherSubject.teacher_id)
-            .group_by(Teacher.first_name)
-            .group_by(Teacher.last_name)
-        )
+    async with AsyncReadSession() as session:
+        avg_grades = await session.execute(select_8_query())
         avg_grades = avg_grades.all()
         return avg_grades
 
+def select_9_query(student_id: int) -> Select:
+    return (
+        select(
+            func.count(Student.id).label("rows_count"), Subject.name,
+            Student.first_name, Student.last_name
+        )
+        .join(StudentGrade, Student.id == StudentGrade.student_id)
+        .join(Subject, Subject.id == StudentGrade.subject_id)
+        .where(Student.id == student_id)
+        .group_by(Subject.name)
+        .group_by(Student.first_name)
+        .group_by(Student.last_name)
+    )
+
+
+@cached_report(Student, StudentGrade, Subject)
 async def select_9(student_id: int):
     # Знайти список курсів, які відвідує студент.
-    async with AsyncDBSession() as session:
-        courses = await session.execute(
-            select(
-                func.count(Student.id).label("rows_count"), Subject.name,
-                Student.first_name, Student.last_name
-            )
-            .join(StudentGrade, Student.id == StudentGrade.student_id)
-            .join(Subject, Subject.id == StudentGrade.subject_id)
-            .where(Student.id == student_id)
-            .group_by(Subject.name)
-            .group_by(Student.first_name)
-            .group_by(Student.last_name)
-        )
+    async with AsyncReadSession() as session:
+        courses = await session.execute(select_9_query(student_id))
         courses = courses.all()
         return courses
 
+def select_10_query(teacher_id: int, student_id: int) -> Select:
+    return (
+        select(
+            func.count(Student.id).label("rows_count"), Subject.name,
+            Student.first_name, Student.last_name, Teacher.first_name,
+            Teacher.last_name
+        )
+        .join(StudentGrade, Student.id == StudentGrade.student_id)
+        .join(Subject, Subject.id == StudentGrade.subject_id)
+        .join(TeacherSubject, TeacherSubject.subject_id == Subject.id)
+        .join(Teacher, Teacher.id == TeacherSubject.teacher_id)
+        .where(and_(Teacher.id == teacher_id, Student.id == student_id))
+        .group_by(Subject.name)
+        .group_by(Teacher.first_name)
+        .group_by(Teacher.last_name)
+        .group_by(Student.first_name)
+        .group_by(Student.last_name)
+    )
+
+
+@cached_report(Student, StudentGrade, Subject, TeacherSubject, Teacher)
 async def select_10(teacher_id: int, student_id: int):
     # Список курсів, які певному студенту читає певний викладач.
-    async with AsyncDBSession() as session:
-        courses = await session.execute(
-            select(
-                func.count(Student.id).label("rows_count"), Subject.name,
-                Student.first_name, Student.last_name, Teacher.first_name,
-                Teacher.last_name
-            )
-            .join(StudentGrade, Student.id == StudentGrade.student_id)
-            .join(Subject, Subject.id == StudentGrade.subject_id)
-            .join(TeacherSubject, TeacherSubject.subject_id == Subject.id)
-            .join(Teacher, Teacher.id == TeacherSubject.teacher_id)
-            .where(and_(Teacher.id == teacher_id, Student.id == student_id))
-            .group_by(Subject.name)
-            .group_by(Teacher.first_name)
-            .group_by(Teacher.last_name)
-            .group_by(Student.first_name)
-            .group_by(Student.last_name)
-        )
+    async with AsyncReadSession() as session:
+        courses = await session.execute(select_10_query(teacher_id, student_id))
         courses = courses.all()
         return courses
 
+def select_1_additional_query(teacher_id: int, student_id: int) -> Select:
+    return (
+        select(
+            func.round(func.avg(StudentGrade.grade_value), 2).label("avg_grade"),
+            Student.first_name, Student.last_name, Teacher.first_name,
+            Teacher.last_name
+        )
+        .select_from(StudentGrade)
+        .join(Student, Student.id == StudentGrade.student_id)
+        .join(Subject, Subject.id == StudentGrade.subject_id)
+        .join(TeacherSubject, TeacherSubject.subject_id == Subject.id)
+        .join(Teacher, Teacher.id == TeacherSubject.teacher_id)
+        .where(and_(Teacher.id == teacher_id, Student.id == student_id))
+        .group_by(Teacher.first_name)
+        .group_by(Teacher.last_name)
+        .group_by(Student.first_name)
+        .group_by(Student.last_name)
+    )
+
+
+@cached_report(Grade, StudentGrade, Student, Subject, TeacherSubject, Teacher)
 async def select_1_additional(teacher_id: int, student_id: int):
     # Середній бал, який певний викладач ставить певному студентові.
-    async with AsyncDBSession() as session:
-        avg_grade = await session.execute(
-            select(
-                func.round(func.avg(Grade.value), 2).label("avg_grade"),
-                Student.first_name, Student.last_name, Teacher.first_name,
-                Teacher.last_name
-            )
-            .join(StudentGrade, Grade.id == StudentGrade.grade_id)
-            .join(Student, Student.id == StudentGrade.student_id)
-            .join(Subject, Subject.id == StudentGrade.subject_id)
-            .join(TeacherSubject, TeacherSubject.subject_id == Subject.id)
-            .join(Teacher, Teacher.id == TeacherSubject.teacher_id)
-            .where(and_(Teacher.id == teacher_id, Student.id == student_id))
-            .group_by(Teacher.first_name)
-            .group_by(Teacher.last_name)
-            .group_by(Student.first_name)
-            .group_by(Student.last_name)
-        )
+    async with AsyncReadSession() as session:
+        avg_grade = await session.execute(select_1_additional_query(teacher_id, student_id))
         avg_grade = avg_grade.one_or_none()
         return avg_grade
 
+def select_2_additional_query(subject_name: str, group_code: str) -> Select:
+    return (
+        select(
+            func.max(StudentGrade.id).label("max_student_grade_id"),
+            func.max(StudentGrade.created_at).label("max_student_created_at"),
+            Student.first_name, Student.last_name,
+            Group.code, Subject.name.label("subject_name")
+        )
+        .join(Student, Student.id == StudentGrade.student_id)
+        .join(Subject, Subject.id == StudentGrade.subject_id)
+        .join(StudentGroup, StudentGroup.student_id == Student.id)
+        .join(Group, Group.id == StudentGroup.group_id)
+        .where(and_(Subject.name == subject_name, Group.code == group_code))
+        .group_by(Student.first_name)
+        .group_by(Student.last_name)
+        .group_by(Group.code)
+        .group_by(Subject.name)
+        .group_by(Student.id)
+        .group_by(Subject.id)
+    )
+
+
+@cached_report(StudentGrade, Student, Subject, StudentGroup, Group)
 async def select_2_additional(subject_name: str, group_code: str):
     # Оцінки студентів у певній групі з певного предмета на останньому занятті.
-    async with AsyncDBSession() as session:
+    async with AsyncReadSession() as session:
         avg_grade = await session.execute(
-            select(
-                func.max(StudentGrade.id).label("max_student_grade_id"),
-                func.max(StudentGrade.created_at).label("max_student_created_at"),
-                Student.first_name, Student.last_name,
-                Group.code, Subject.name.label("subject_name")
-            )
-            .join(Student, Student.id == StudentGrade.student_id)
-            .join(Subject, Subject.id == StudentGrade.subject_id)
-            .join(StudentGroup, StudentGroup.student_id == Student.id)
-            .join(Group, Group.id == StudentGroup.group_id)
-            .where(and_(Subject.name == subject_name, Group.code == group_code))
-            .group_by(Student.first_name)
-            .group_by(Student.last_name)
-            .group_by(Group.code)
-            .group_by(Subject.name)
-            .group_by(Student.id)
-            .group_by(Subject.id)
+            select_2_additional_query(subject_name, group_code)
         )
         avg_grade = avg_grade.all()
         return avg_grade
 
+
+def select_2_additional_window_query(subject_name: str, group_code: str) -> Select:
+    # Latest grade of every student of the group in the subject, ranked with
+    # ROW_NUMBER over ix_students_grades_subject_student_created
+    group_students = (
+        select(StudentGroup.student_id)
+        .join(Group, Group.id == StudentGroup.group_id)
+        .where(Group.code == group_code)
+    )
+    latest = (
+        select(
+            StudentGrade.id, StudentGrade.student_id, StudentGrade.grade_value,
+            StudentGrade.created_at, Subject.name,
+            func.row_number().over(
+                partition_by=StudentGrade.student_id,
+                order_by=(StudentGrade.created_at.desc(), StudentGrade.id.desc()),
+            ).label("row_number"),
+        )
+        .join(Subject, Subject.id == StudentGrade.subject_id)
+        .where(and_(
+            Subject.name == subject_name,
+            StudentGrade.student_id.in_(group_students),
+        ))
+        .subquery()
+    )
+    return (
+        select(
+            latest.c.id.label("student_grade_id"),
+            latest.c.created_at.label("student_created_at"),
+            latest.c.grade_value,
+            Student.first_name, Student.last_name,
+            literal(group_code).label("code"),
+            latest.c.name.label("subject_name"),
+        )
+        .join(Student, Student.id == latest.c.student_id)
+        .where(latest.c.row_number == 1)
+    )
+
+
+@cached_report(StudentGrade, Student, Subject, StudentGroup, Group)
+async def select_2_additional_window(subject_name: str, group_code: str):
+    # Оцінки студентів у певній групі з певного предмета на останньому занятті.
+    async with AsyncReadSession() as session:
+        grades = await session.execute(
+            select_2_additional_window_query(subject_name, group_code)
+        )
+        grades = grades.all()
+        return grades
+
+
+REPORTS = {
+    "select_1": select_1,
+    "select_2": select_2,
+    "select_3": select_3,
+    "select_4": select_4,
+    "select_5": select_5,
+    "select_6": select_6,
+    "select_7": select_7,
+    "select_8": select_8,
+    "select_9": select_9,
+    "select_10": select_10,
+    "select_1_additional": select_1_additional,
+    "select_2_additional": select_2_additional,
+    "select_2_additional_window": select_2_additional_window,
+}
+
+
+def report_args(
+        subject_name: str, group_code: str, teacher_id: int, student_id: int
+) -> dict[str, dict]:
+    # Keyword arguments for every report in REPORTS (and its `_query` builder)
+    subject = {"subject_name": subject_name}
+    group = {"group_code": group_code}
+    teacher_student = {"teacher_id": teacher_id, "student_id": student_id}
+    return {
+        "select_1": {},
+        "select_2": subject,
+        "select_3": subject,
+        "select_4": {},
+        "select_5": {"teacher_id": teacher_id},
+        "select_6": group,
+        "select_7": {**group, **subject},
+        "select_8": {},
+        "select_9": {"student_id": student_id},
+        "select_10": teacher_student,
+        "select_1_additional": teacher_student,
+        "select_2_additional": {**subject, **group},
+        "select_2_additional_window": {**subject, **group},
+    }
+
+
+async def sample_report_args(subject_name: str = "MATH") -> dict[str, dict]:
+    # report_args for the first group, teacher and student in DB
+    async with AsyncReadSession() as session:
+        group_code = await session.scalar(
+            select(Group.code).order_by(Group.id).limit(1)
+        )
+        teacher_id = await session.scalar(
+            select(Teacher.id).order_by(Teacher.id).limit(1)
+        )
+        student_id = await session.scalar(
+            select(Student.id).order_by(Student.id).limit(1)
+        )
+    return report_args(subject_name, group_code, teacher_id, student_id)
+
+
+class Page(NamedTuple):
+    rows: list[Row]
+    cursor: str | None
+
+
+# Query builder and the unique keyset columns used to page through its result.
+PAGINATED_SELECTS: dict[str, tuple[Callable[..., Select], tuple]] = {
+    "select_5": (select_5_query, (TeacherSubject.id,)),
+    "select_6": (select_6_query, (StudentGroup.id,)),
+    "select_7": (select_7_query, (StudentGrade.id, StudentGroup.id)),
+    "select_8": (select_8_query, (Teacher.first_name, Teacher.last_name)),
+    "select_9": (select_9_query, (Subject.name,)),
+    "select_10": (select_10_query, (Subject.name,)),
+    "select_2_additional": (select_2_additional_query, (Student.id,)),
+    "select_2_additional_window": (select_2_additional_window_query, (Student.id,)),
+}
+
+
+def encode_cursor(values: Sequence) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(values)).encode()).decode()
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    # Cursors come from clients, anything but `size` plain values is rejected
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        # binascii.Error, UnicodeDecodeError and JSONDecodeError
+        raise ValueError("invalid cursor")
+    if (not isinstance(values, list) or len(values) != size
+            or any(isinstance(value, (list, dict)) for value in values)):
+        raise ValueError("invalid cursor")
+    return values
+
+
+async def select_page(
+        name: str, *args, limit: int = 50, cursor: str = None, **kwargs
+) -> Page:
+    """
+    Keyset page of the `name` report: rows ordered by the report keys that come
+    after `cursor`, plus the cursor of the next page (None on the last one).
+    Page rows carry the key values as trailing `cursor_N` columns. A cursor
+    that isn't one of this report raises ValueError("invalid cursor").
+    """
+    build_query, keys = PAGINATED_SELECTS[name]
+    query = (
+        build_query(*args, **kwargs)
+        .add_columns(*(key.label(f"cursor_{i}") for i, key in enumerate(keys)))
+        .order_by(None)
+        .order_by(*keys)
+        .limit(limit)
+    )
+    if cursor:
+        values = decode_cursor(cursor, len(keys))
+        query = query.where(tuple_(*keys) > tuple_(*values))
+    async with AsyncReadSession() as session:
+        rows = await session.execute(query)
+        rows = rows.all()
+    next_cursor = None
+    if len(rows) == limit:
+        next_cursor = encode_cursor(rows[-1][-len(keys):])
+    return Page(rows=rows, cursor=next_cursor)
+
 if __name__ == "__main__":
     rows = asyncio.run(select_2_additional(subject_name="LITERATURE", group_code="Johnson"))
     print(len(rows))
@@ -0,0 +1,288 @@
+"""
+HTTP service exposing the my_select reports as JSON, built on asyncio streams.
+
+    python report_service.py --port 8080
+    curl 'http://127.0.0.1:8080/reports/select_2?subject_name=MATH'
+    curl 'http://127.0.0.1:8080/metrics'
+
+Endpoints:
+    GET /reports          names of the reports and their arguments
+    GET /reports/<name>   report result, arguments as query parameters
+    GET /metrics          per-endpoint latency histograms (Prometheus text)
+
+All requests share the engine pool of db.py. Identical concurrent requests of a
+report are coalesced into a single query, responses are gzip compressed when
+the client accepts it. Locally it runs against SQLite with aiosqlite from the
+dev dependencies. `--load-test` runs a small load generator against a
+running service:
+
+    python report_service.py --load-test /reports/select_1 --requests 2000 --concurrency 50
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gzip
+import inspect
+import json
+import logging
+import time
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Hashable
+from urllib.parse import parse_qsl, urlsplit
+
+import my_select
+from cache import report_cache
+from db import dispose_engine, pool_status
+from reports import serialize_result
+
+LATENCY_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+GZIP_MIN_SIZE = 1024
+INT_ARGS = ("teacher_id", "student_id")
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found",
+               405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+class LatencyHistogram:
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum_ms = 0.0
+
+    def observe(self, ms: float) -> None:
+        self.count += 1
+        self.sum_ms += ms
+        for i, bound in enumerate(self.buckets):
+            if ms <= bound:
+                self.counts[i] += 1
+
+    def format(self, name: str, endpoint: str) -> list[str]:
+        label = f'endpoint="{endpoint}"'
+        lines = [
+            f'{name}_bucket{{{label},le="{bound}"}} {count}'
+            for bound, count in zip(self.buckets, self.counts)
+        ]
+        lines.append(f'{name}_bucket{{{label},le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum{{{label}}} {round(self.sum_ms, 3)}")
+        lines.append(f"{name}_count{{{label}}} {self.count}")
+        return lines
+
+
+class Coalescer:
+    """Runs one call per key at a time, concurrent callers of the key share it."""
+
+    def __init__(self):
+        self.in_flight: dict[Hashable, asyncio.Task] = {}
+        self.coalesced = 0
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        task = self.in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self.in_flight[key] = task
+            task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # shield: a client going away doesn't cancel the query of the others
+        return await asyncio.shield(task)
+
+
+class ReportService:
+    def __init__(self):
+        self.latency: dict[str, LatencyHistogram] = defaultdict(LatencyHistogram)
+        self.statuses: dict[tuple[str, int], int] = defaultdict(int)
+        self.coalescer = Coalescer()
+
+    async def run_report(self, name: str, query: dict[str, str]) -> bytes:
+        report = my_select.REPORTS[name]
+        params = inspect.signature(report).parameters
+        kwargs = {}
+        for param in params:
+            if param not in query:
+                raise ValueError(f"Query parameter '{param}' is required")
+            kwargs[param] = int(query[param]) if param in INT_ARGS else query[param]
+        key = (name, tuple(sorted(kwargs.items())))
+
+        async def execute() -> bytes:
+            result = await report(**kwargs)
+            return json.dumps(serialize_result(result), default=str).encode()
+
+        return await self.coalescer.run(key, execute)
+
+    def metrics(self) -> bytes:
+        lines = [
+            "# TYPE report_service_latency_ms histogram",
+        ]
+        for endpoint, histogram in sorted(self.latency.items()):
+            lines += histogram.format("report_service_latency_ms", endpoint)
+        lines.append("# TYPE report_service_responses_total counter")
+        for (endpoint, status), count in sorted(self.statuses.items()):
+            lines.append(
+                f'report_service_responses_total{{endpoint="{endpoint}",'
+                f'status="{status}"}} {count}'
+            )
+        lines.append("# TYPE report_service_coalesced_total counter")
+        lines.append(f"report_service_coalesced_total {self.coalescer.coalesced}")
+        for key, value in report_cache.stats().items():
+            lines.append(f"report_cache_{key} {value}")
+        for key, value in pool_status().items():
+            if isinstance(value, (int, float)):
+                lines.append(f"db_pool_{key} {value}")
+        return ("\n".join(lines) + "\n").encode()
+
+    async def route(self, method: str, target: str) -> tuple[str, int, str, bytes]:
+        # (endpoint label, status, content type, body)
+        url = urlsplit(target)
+        path = url.path.rstrip("/") or "/"
+        if method != "GET":
+            # Fixed label, any client path would be a new metrics series
+            return "other", 405, "application/json", b'{"error": "only GET is served"}'
+        if path == "/metrics":
+            return path, 200, "text/plain; version=0.0.4", self.metrics()
+        if path == "/reports":
+            body = {
+                name: list(inspect.signature(report).parameters)
+                for name, report in my_select.REPORTS.items()
+            }
+            return path, 200, "application/json", json.dumps(body).encode()
+        name = path.removeprefix("/reports/")
+        if not path.startswith("/reports/") or name not in my_select.REPORTS:
+            return "other", 404, "application/json", b'{"error": "not found"}'
+        try:
+            body = await self.run_report(name, dict(parse_qsl(url.query)))
+        except ValueError as e:
+            return path, 400, "application/json", json.dumps({"error": str(e)}).encode()
+        return path, 200, "application/json", body
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                method, target, version = request_line.decode("latin-1").split()
+
+                started_at = time.perf_counter()
+                try:
+                    endpoint, status, content_type, body = await self.route(
+                        method, target
+                    )
+                except Exception as e:
+                    logging.exception(f"{method} {target} failed")
+                    endpoint, status, content_type = "error", 500, "application/json"
+                    body = json.dumps({"error": repr(e)}).encode()
+
+                response_headers = [f"Content-Type: {content_type}"]
+                if (len(body) >= GZIP_MIN_SIZE
+                        and "gzip" in headers.get("accept-encoding", "")):
+                    body = gzip.compress(body, compresslevel=5)
+                    response_headers.append("Content-Encoding: gzip")
+                keep_alive = (
+                    headers.get("connection", "").lower() != "close"
+                    and version == "HTTP/1.1"
+                )
+                response_headers.append(f"Content-Length: {len(body)}")
+                response_headers.append(
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}"
+                )
+                writer.write(
+                    f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n".encode()
+                    + "\r\n".join(response_headers).encode() + b"\r\n\r\n" + body
+                )
+                await writer.drain()
+                self.latency[endpoint].observe((time.perf_counter() - started_at) * 1000)
+                self.statuses[(endpoint, status)] += 1
+                if not keep_alive:
+                    break
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(host: str, port: int) -> None:
+    service = ReportService()
+    server = await asyncio.start_server(service.handle, host, port)
+    logging.info(f"Serving reports on http://{host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await dispose_engine()
+
+
+async def load_test(
+        host: str, port: int, target: str, requests: int, concurrency: int
+) -> dict[str, Any]:
+    latencies, errors = [], 0
+    remaining = iter(range(requests))
+    request = (
+        f"GET {target} HTTP/1.1\r\nHost: {host}\r\nAccept-Encoding: gzip\r\n\r\n"
+    ).encode()
+
+    async def worker():
+        nonlocal errors
+        reader, writer = await asyncio.open_connection(host, port)
+        for _ in remaining:
+            started_at = time.perf_counter()
+            try:
+                writer.write(request)
+                status_line = await reader.readline()
+                if not status_line:
+                    raise ConnectionError("the server closed the connection")
+                status = int(status_line.split()[1])
+                length = 0
+                while (line := await reader.readline()) not in (b"\r\n", b""):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":")[1])
+                await reader.readexactly(length)
+            except (ConnectionError, EOFError):
+                # Failed request, the next one goes over a new connection
+                errors += 1
+                writer.close()
+                reader, writer = await asyncio.open_connection(host, port)
+                continue
+            latencies.append((time.perf_counter() - started_at) * 1000)
+            errors += status != 200
+        writer.close()
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    seconds = time.perf_counter() - started_at
+    # Only the completed requests have a latency
+    latencies = sorted(latencies) or [0.0]
+    return {
+        "requests": requests,
+        "errors": errors,
+        "seconds": round(seconds, 3),
+        "requests_per_sec": round(requests / seconds),
+        "p50_ms": round(latencies[len(latencies) // 2], 3),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99)], 3),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HTTP service of my_select reports")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--load-test", metavar="PATH",
+                        help="send requests to a running service instead of serving")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    logging.basicConfig(format="%(asctime)s %(message)s", level=logging.INFO)
+    if args.load_test:
+        print(json.dumps(asyncio.run(load_test(
+            args.host, args.port, args.load_test, args.requests, args.concurrency
+        )), indent=2))
+    else:
+        try:
+            asyncio.run(serve(args.host, args.port))
+        except KeyboardInterrupt:
+            pass
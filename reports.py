@@ -0,0 +1,127 @@
+"""
+Runs a set of my_select reports concurrently and writes all results to one
+JSON file.
+
+    python reports.py --output weekly.json
+    python reports.py --reports select_1 select_7 --group Smith --concurrency 2
+
+Every report uses its own pooled session, at most `--concurrency` of them run
+at the same time. With `--numpy` the aggregate reports listed in
+analytics.ANALYTICS_REPORTS are answered in memory from a single scan of
+students_grades instead. Arguments not given are taken from the first group,
+teacher and student in DB.
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Any
+
+import my_select
+from db import dispose_engine, pool_status
+
+
+def serialize_result(result: Any) -> dict[str, Any]:
+    rows = result if isinstance(result, list) else [] if result is None else [result]
+    columns = list(rows[0]._fields) if rows and hasattr(rows[0], "_fields") else []
+    return {"columns": columns, "rows": [list(row) for row in rows]}
+
+
+async def run_report(
+        name: str, kwargs: dict, semaphore: asyncio.Semaphore
+) -> dict[str, Any]:
+    async with semaphore:
+        started_at = time.perf_counter()
+        try:
+            result = await my_select.REPORTS[name](**kwargs)
+            outcome = {"args": kwargs, **serialize_result(result)}
+        except Exception as e:
+            outcome = {"args": kwargs, "error": repr(e)}
+        outcome["seconds"] = round(time.perf_counter() - started_at, 4)
+        return outcome
+
+
+async def run_reports(
+        names: list[str], reports_args: dict[str, dict], concurrency: int = 5
+) -> dict[str, Any]:
+    semaphore = asyncio.Semaphore(concurrency)
+    started_at = time.perf_counter()
+    outcomes = await asyncio.gather(*(
+        run_report(name, reports_args[name], semaphore) for name in names
+    ))
+    wall_seconds = time.perf_counter() - started_at
+    return {
+        "wall_seconds": round(wall_seconds, 4),
+        "sum_seconds": round(sum(outcome["seconds"] for outcome in outcomes), 4),
+        "reports": dict(zip(names, outcomes)),
+    }
+
+
+async def run_analytics_reports(
+        names: list[str], reports_args: dict[str, dict]
+) -> dict[str, Any]:
+    from analytics import GradesFrame
+
+    started_at = time.perf_counter()
+    frame = await GradesFrame.load()
+    load_seconds = time.perf_counter() - started_at
+    outcomes = {}
+    for name in names:
+        started_at = time.perf_counter()
+        result = getattr(frame, name)(**reports_args[name])
+        outcomes[name] = {"args": reports_args[name], **serialize_result(result)}
+        outcomes[name]["seconds"] = round(time.perf_counter() - started_at, 4)
+    return {"load_seconds": round(load_seconds, 4), "reports": outcomes}
+
+
+async def main(args: argparse.Namespace) -> dict[str, Any]:
+    reports_args = await my_select.sample_report_args(subject_name=args.subject)
+    overrides = {
+        "group_code": args.group,
+        "teacher_id": args.teacher_id,
+        "student_id": args.student_id,
+    }
+    for kwargs in reports_args.values():
+        for key, value in overrides.items():
+            if key in kwargs and value is not None:
+                kwargs[key] = value
+
+    in_memory = []
+    if args.numpy:
+        from analytics import ANALYTICS_REPORTS
+        in_memory = [name for name in args.reports if name in ANALYTICS_REPORTS]
+    result = await run_reports(
+        [name for name in args.reports if name not in in_memory], reports_args,
+        args.concurrency,
+    )
+    if in_memory:
+        analytics = await run_analytics_reports(in_memory, reports_args)
+        result["analytics_load_seconds"] = analytics["load_seconds"]
+        result["reports"].update(analytics["reports"])
+    result["pool"] = pool_status()
+    await dispose_engine()
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run my_select reports")
+    parser.add_argument("--reports", nargs="+", choices=list(my_select.REPORTS),
+                        default=list(my_select.REPORTS))
+    parser.add_argument("--concurrency", type=int, default=5)
+    parser.add_argument("--numpy", action="store_true",
+                        help="answer the aggregate reports in memory with NumPy")
+    parser.add_argument("--output", default="reports.json")
+    parser.add_argument("--subject", default="MATH")
+    parser.add_argument("--group")
+    parser.add_argument("--teacher-id", type=int)
+    parser.add_argument("--student-id", type=int)
+    args = parser.parse_args()
+
+    result = asyncio.run(main(args))
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(result, file, indent=2, default=str)
+    for name, outcome in result["reports"].items():
+        status = outcome.get("error") or f"{len(outcome['rows'])} rows"
+        print(f"{name:<22} {outcome['seconds'] * 1000:>9.1f} ms  {status}")
+    print(f"wall time {result['wall_seconds'] * 1000:.1f} ms, sum of reports "
+          f"{result['sum_seconds'] * 1000:.1f} ms")
@@ -1,5 +1,9 @@
+import argparse
 import asyncio
-from datetime import datetime
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
 
 import faker
 from random import randint, choice
@@ -7,6 +11,7 @@ from random import randint, choice
 from enums import GENDER, GRADE, SUBJECT
 from models import (
     insert_objects,
+    insert_rows,
     Student,
     Group,
     StudentGrade,
@@ -23,6 +28,20 @@ NUMBER_STUDENTS_IN_GROUPS = 20
 NUMBER_SUBJECTS = len(SUBJECT)
 NUMBER_TEACHERS = 5
 NUMBER_GRADES = 20
+BATCH_SIZE = 5000
+SHARDS_PER_WORKER = 4
+# Default reference time of the parallel seed, fixed so runs are reproducible
+SEED_NOW = datetime(2026, 1, 1)
+# Seeded grades get ids in GRADE order, so grade_id - 1 indexes their values
+GRADE_VALUES = [grade.value.get("value") for grade in GRADE]
+
+
+def _unique_pairs(rng, count: int, first_max: int, second_max: int) -> list[tuple]:
+    # `count` random id pairs without the repeats, one link row per pair
+    return list(dict.fromkeys(
+        (rng.randint(1, first_max), rng.randint(1, second_max))
+        for _ in range(count)
+    ))
 
 
 def generate_fake_data() -> dict[str, list]:
@@ -53,12 +72,12 @@ def generate_fake_data() -> dict[str, list]:
         name, code = fake_data.name().split()[:2]
         fake_groups.append(Group(name=name, code=code))
 
-    for _ in range(NUMBER_STUDENTS_IN_GROUPS * NUMBER_GROUPS):
+    for student_id, group_id in _unique_pairs(
+            random, NUMBER_STUDENTS_IN_GROUPS * NUMBER_GROUPS, NUMBER_STUDENTS,
+            NUMBER_GROUPS
+    ):
         fake_students_groups.append(
-            StudentGroup(
-                student_id=randint(1, NUMBER_STUDENTS),
-                group_id=randint(1, NUMBER_GROUPS),
-            )
+            StudentGroup(student_id=student_id, group_id=group_id)
         )
 
     for _ in range(NUMBER_TEACHERS):
@@ -79,12 +98,12 @@ def generate_fake_data() -> dict[str, list]:
             )
         )
 
-    for _ in range(NUMBER_SUBJECTS * NUMBER_TEACHERS):
+    for teacher_id, subject_id in _unique_pairs(
+            random, NUMBER_SUBJECTS * NUMBER_TEACHERS, NUMBER_TEACHERS,
+            NUMBER_SUBJECTS
+    ):
         fake_teachers_subjects.append(
-            TeacherSubject(
-                teacher_id=randint(1, NUMBER_TEACHERS),
-                subject_id=randint(1, NUMBER_SUBJECTS),
-            )
+            TeacherSubject(teacher_id=teacher_id, subject_id=subject_id)
         )
 
     for grade in GRADE:
@@ -93,10 +112,12 @@ def generate_fake_data() -> dict[str, list]:
         )
 
     for _ in range(NUMBER_GRADES * NUMBER_STUDENTS * NUMBER_SUBJECTS):
+        grade_id = randint(1, len(GRADE))
         fake_students_grades.append(
             StudentGrade(
                 student_id=randint(1, NUMBER_STUDENTS),
-                grade_id=randint(1, len(GRADE)),
+                grade_id=grade_id,
+                grade_value=GRADE_VALUES[grade_id - 1],
                 subject_id=randint(1, NUMBER_SUBJECTS),
             )
         )
@@ -107,17 +128,268 @@ def generate_fake_data() -> dict[str, list]:
         "students_groups": fake_students_groups,
         "teachers": fake_teachers,
         "subjects": fake_subjects,
-        "teachers_subjects": set(fake_teachers_subjects),
+        "teachers_subjects": fake_teachers_subjects,
         "grades": fake_grades,
         "students_grades": fake_students_grades,
     }
 
 
+TABLE_MODELS = {
+    "students": Student,
+    "groups": Group,
+    "students_groups": StudentGroup,
+    "teachers": Teacher,
+    "subjects": Subject,
+    "teachers_subjects": TeacherSubject,
+    "grades": Grade,
+    "students_grades": StudentGrade,
+}
+
+
+def _fake_people(
+        fake_data: faker.Faker, rng: random.Random, count: int, now: datetime
+) -> list[dict]:
+    genders = (GENDER.MALE.value, GENDER.FEMALE.value)
+    people = []
+    for _ in range(count):
+        first_name, last_name = fake_data.name().split()[:2]
+        people.append({
+            "first_name": first_name,
+            "last_name": last_name,
+            "birthdate": datetime.strptime(
+                fake_data.date(end_datetime=now), "%Y-%m-%d"
+            ),
+            "gender": rng.choice(genders),
+            "created_at": now,
+        })
+    return people
+
+
+def _fake_students_grades(
+        rng: random.Random, count: int, number_students: int, now: datetime
+) -> list[dict]:
+    rows = []
+    for _ in range(count):
+        grade_id = rng.randint(1, len(GRADE))
+        rows.append({
+            "student_id": rng.randint(1, number_students),
+            "grade_id": grade_id,
+            "grade_value": GRADE_VALUES[grade_id - 1],
+            "subject_id": rng.randint(1, NUMBER_SUBJECTS),
+            "created_at": now - timedelta(minutes=rng.randint(0, 60 * 24 * 180)),
+        })
+    return rows
+
+
+def _fake_dimensions(
+        fake_data: faker.Faker, rng: random.Random, number_students: int,
+        number_groups: int, now: datetime
+) -> dict[str, list[dict]]:
+    groups = []
+    for _ in range(number_groups):
+        name, code = fake_data.name().split()[:2]
+        groups.append({"name": name, "code": code})
+
+    return {
+        "groups": groups,
+        "students_groups": [
+            {"student_id": student_id, "group_id": group_id}
+            for student_id, group_id in _unique_pairs(
+                rng, NUMBER_STUDENTS_IN_GROUPS * number_groups, number_students,
+                number_groups
+            )
+        ],
+        "teachers": _fake_people(fake_data, rng, NUMBER_TEACHERS, now),
+        "subjects": [
+            {"name": subject.value, "description": f"'{subject.value}' description"}
+            for subject in SUBJECT
+        ],
+        "teachers_subjects": [
+            {"teacher_id": teacher_id, "subject_id": subject_id}
+            for teacher_id, subject_id in _unique_pairs(
+                rng, NUMBER_SUBJECTS * NUMBER_TEACHERS, NUMBER_TEACHERS,
+                NUMBER_SUBJECTS
+            )
+        ],
+        "grades": [
+            {
+                "code": grade.value.get("code"),
+                "value": grade.value.get("value"),
+                "created_at": now,
+                "updated_at": now,
+            }
+            for grade in GRADE
+        ],
+    }
+
+
+def _scaled_sizes(scale: float) -> tuple[int, int]:
+    number_students = max(1, round(NUMBER_STUDENTS * scale))
+    number_groups = max(1, round(NUMBER_GROUPS * scale))
+    return number_students, number_groups
+
+
+def _split(total: int, shards: int) -> list[int]:
+    size, rest = divmod(total, shards)
+    return [size + (1 if i < rest else 0) for i in range(shards)]
+
+
+def generate_fake_rows(scale: float = 1) -> dict[str, list[dict]]:
+    """
+    Same data set as `generate_fake_data`, but as plain dicts for the bulk
+    insert path. `scale` multiplies NUMBER_STUDENTS, and since NUMBER_GRADES is
+    given per student and subject, the number of grade rows grows with it.
+    """
+    number_students, number_groups = _scaled_sizes(scale)
+    fake_data = faker.Faker()
+    rng = random.Random()
+    now = datetime.now()
+    dimensions = _fake_dimensions(
+        fake_data, rng, number_students, number_groups, now
+    )
+    return {
+        "students": _fake_people(fake_data, rng, number_students, now),
+        "groups": dimensions["groups"],
+        "students_groups": dimensions["students_groups"],
+        "teachers": dimensions["teachers"],
+        "subjects": dimensions["subjects"],
+        "teachers_subjects": dimensions["teachers_subjects"],
+        "grades": dimensions["grades"],
+        "students_grades": _fake_students_grades(
+            rng, NUMBER_GRADES * number_students * NUMBER_SUBJECTS,
+            number_students, now
+        ),
+    }
+
+
+def generate_students_shard(shard_seed: str, count: int, now: datetime) -> list[dict]:
+    fake_data = faker.Faker()
+    fake_data.seed_instance(shard_seed)
+    return _fake_people(fake_data, random.Random(shard_seed), count, now)
+
+
+def generate_students_grades_shard(
+        shard_seed: str, count: int, number_students: int, now: datetime
+) -> list[dict]:
+    return _fake_students_grades(
+        random.Random(shard_seed), count, number_students, now
+    )
+
+
 async def insert_data_to_db():
     fake_data = generate_fake_data()
     for table_name, table_data in fake_data.items():
         await insert_objects(rows=table_data)
 
 
+def _stats(rows_count: int, started_at: float) -> dict[str, float]:
+    elapsed = time.perf_counter() - started_at
+    return {
+        "rows": rows_count,
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(rows_count / elapsed) if elapsed else rows_count,
+    }
+
+
+async def insert_data_to_db_bulk(
+        scale: float = 1, batch_size: int = BATCH_SIZE
+) -> dict[str, float]:
+    fake_rows = generate_fake_rows(scale=scale)
+    started_at = time.perf_counter()
+    rows_count = 0
+    for table_name, table_rows in fake_rows.items():
+        rows_count += await insert_rows(
+            model=TABLE_MODELS[table_name], rows=table_rows, batch_size=batch_size
+        )
+    return _stats(rows_count, started_at)
+
+
+async def insert_data_to_db_parallel(
+        scale: float = 1, batch_size: int = BATCH_SIZE, workers: int = 4,
+        seed: int = 0, now: datetime = SEED_NOW
+) -> dict[str, float]:
+    """
+    Students and grades are generated in a process pool, split into
+    `workers * SHARDS_PER_WORKER` shards each seeded from `seed` and the shard
+    number, so the data set is reproducible for a given seed and worker count.
+    Timestamps are relative to `now`, not the wall clock.
+    Shards are written in submission order as soon as each one is ready, while
+    the pool keeps producing the next ones.
+    """
+    number_students, number_groups = _scaled_sizes(scale)
+    shards = workers * SHARDS_PER_WORKER
+    started_at = time.perf_counter()
+    rows_count = 0
+
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        students_shards = [
+            loop.run_in_executor(
+                pool, generate_students_shard, f"{seed}:students:{i}", count, now
+            )
+            for i, count in enumerate(_split(number_students, shards))
+        ]
+        grades_shards = [
+            loop.run_in_executor(
+                pool, generate_students_grades_shard, f"{seed}:grades:{i}",
+                count, number_students, now
+            )
+            for i, count in enumerate(_split(
+                NUMBER_GRADES * number_students * NUMBER_SUBJECTS, shards
+            ))
+        ]
+
+        fake_data = faker.Faker()
+        fake_data.seed_instance(f"{seed}:dimensions")
+        dimensions = _fake_dimensions(
+            fake_data, random.Random(f"{seed}:dimensions"), number_students,
+            number_groups, now
+        )
+        students_groups = dimensions.pop("students_groups")
+        for table_name, table_rows in dimensions.items():
+            rows_count += await insert_rows(
+                model=TABLE_MODELS[table_name], rows=table_rows,
+                batch_size=batch_size
+            )
+        for shard in students_shards:
+            rows_count += await insert_rows(
+                model=Student, rows=await shard, batch_size=batch_size
+            )
+        rows_count += await insert_rows(
+            model=StudentGroup, rows=students_groups, batch_size=batch_size
+        )
+        for shard in grades_shards:
+            rows_count += await insert_rows(
+                model=StudentGrade, rows=await shard, batch_size=batch_size
+            )
+    return _stats(rows_count, started_at)
+
+
 if __name__ == "__main__":
-    asyncio.run(insert_data_to_db())
+    parser = argparse.ArgumentParser(description="Fill the DB with fake data")
+    parser.add_argument("--bulk", action="store_true",
+                        help="use Core bulk inserts (COPY on PostgreSQL)")
+    parser.add_argument("--scale", type=float, default=1)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="generate students and grades in N processes")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--now", type=datetime.fromisoformat, default=SEED_NOW,
+                        help="reference time of the timestamps with --workers")
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        stats = asyncio.run(insert_data_to_db_parallel(
+            scale=args.scale, batch_size=args.batch_size, workers=args.workers,
+            seed=args.seed, now=args.now
+        ))
+    elif args.bulk or args.scale != 1:
+        stats = asyncio.run(
+            insert_data_to_db_bulk(scale=args.scale, batch_size=args.batch_size)
+        )
+    else:
+        stats = None
+        asyncio.run(insert_data_to_db())
+    if stats:
+        print(f"Inserted {stats['rows']} rows in {stats['seconds']}s "
+              f"({stats['rows_per_sec']} rows/sec)")
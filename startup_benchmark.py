@@ -0,0 +1,63 @@
+"""
+Startup cost of cli.py measured with `python -X importtime`.
+
+    python startup_benchmark.py                      # cli.py --help
+    python startup_benchmark.py -- -a list -m Grade  # any cli.py arguments
+
+Runs cli.py `--repeat` times, prints the median wall time, the total import
+time and the slowest top-level imports, and fails if `--help` imports
+SQLAlchemy.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+CLI_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cli.py")
+
+
+def parse_importtime(stderr: str) -> dict[str, int]:
+    # "import time: self [us] | cumulative | imported package"; top-level
+    # imports are the ones without indentation in the package column.
+    imports = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, package = line[len("import time:"):].split("|")
+        if not package.startswith("  "):
+            imports[package.strip()] = int(cumulative)
+    return imports
+
+
+def run_cli(cli_args: list[str]) -> tuple[float, dict[str, int]]:
+    started_at = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", CLI_PATH, *cli_args],
+        capture_output=True, text=True,
+    )
+    return time.perf_counter() - started_at, parse_importtime(result.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure cli.py startup")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("cli_args", nargs="*", default=["--help"])
+    args = parser.parse_args()
+
+    wall_times, imports = [], {}
+    for _ in range(args.repeat):
+        wall_time, imports = run_cli(args.cli_args)
+        wall_times.append(wall_time)
+
+    print(f"cli.py {' '.join(args.cli_args)}")
+    print(f"median wall time: {statistics.median(wall_times) * 1000:.1f} ms "
+          f"({args.repeat} runs)")
+    print(f"total import time: {sum(imports.values()) / 1000:.1f} ms")
+    for package, cumulative in sorted(imports.items(), key=lambda i: -i[1])[:args.top]:
+        print(f"    {cumulative / 1000:>8.1f} ms  {package}")
+
+    if args.cli_args == ["--help"] and "sqlalchemy" in imports:
+        sys.exit("cli.py --help imports SQLAlchemy")
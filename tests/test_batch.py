@@ -0,0 +1,29 @@
+import pytest
+
+from batch import parse_record, record_argv
+from cli import build_parser
+
+
+def test_record_argv_uses_option_kinds():
+    argv = record_argv({
+        "action": "remove", "model": "StudentGroup", "ids": [1, 2],
+        "where": ["group_id=3", "student_id=4"], "stats": True, "name": None,
+    })
+    assert argv == [
+        "--action=remove", "--model=StudentGroup", "--ids", "1", "2",
+        "--where=group_id=3", "--where=student_id=4", "--stats",
+    ]
+
+
+def test_parse_record_checks_types_and_keys():
+    parser = build_parser()
+    op = parse_record(parser, {"action": "update", "model": "Group", "id": "12"})
+    assert (op.action, op.model, op.id) == ("update", "Group", 12)
+    with pytest.raises(Exception, match="Unknown keys"):
+        parse_record(parser, {"model": "Group", "colour": "red"})
+    with pytest.raises(Exception, match="invalid int value"):
+        parse_record(parser, {"ids": [1.5]})
+    with pytest.raises(Exception, match="should be true or false"):
+        parse_record(parser, {"stats": "yes"})
+    with pytest.raises(Exception, match="should be a single value"):
+        parse_record(parser, {"id": [1, 2]})
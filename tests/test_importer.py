@@ -0,0 +1,59 @@
+import asyncio
+import json
+
+import importer
+from models import StudentGrade
+
+LOOKUPS = {
+    "students": {("Ann", "Lee"): 1},
+    "subjects": {"MATH": 2},
+    "grades": {"A": 3},
+}
+
+
+def import_lines(monkeypatch, tmp_path, lines: list[str]) -> tuple[dict, list, list]:
+    written = []
+
+    async def insert_rows(model, rows, batch_size):
+        written.extend(rows)
+        return len(rows)
+
+    async def loader(name):
+        return LOOKUPS[name]
+
+    loaders = {name: (lambda name=name: loader(name)) for name in LOOKUPS}
+    monkeypatch.setitem(
+        importer.IMPORTERS, StudentGrade.__name__,
+        (importer.student_grade_row, loaders),
+    )
+    monkeypatch.setattr(importer, "insert_rows", insert_rows)
+    path, rejected_path = tmp_path / "grades.jsonl", tmp_path / "rejected.jsonl"
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    stats = asyncio.run(importer.import_file(
+        StudentGrade, str(path), rejected_path=str(rejected_path)
+    ))
+    rejected = [
+        json.loads(line)
+        for line in rejected_path.read_text(encoding="utf-8").splitlines()
+    ]
+    return stats, written, rejected
+
+
+def test_import_rejects_non_string_values(monkeypatch, tmp_path):
+    valid = {"name": "Ann Lee", "subject": "MATH", "grade": "A"}
+    lines = [
+        json.dumps(valid),
+        json.dumps({**valid, "name": 123}),
+        json.dumps({**valid, "subject": ["MATH"]}),
+        json.dumps({**valid, "grade": {"code": "A"}}),
+        "{not json",
+        "[1, 2]",
+    ]
+    stats, written, rejected = import_lines(monkeypatch, tmp_path, lines)
+
+    assert stats["imported"] == 1
+    assert written == [{"student_id": 1, "subject_id": 2, "grade_id": 3}]
+    assert [item["line"] for item in rejected] == [2, 3, 4, 5, 6]
+    assert rejected[0]["reason"] == "name should be a string, got 123"
+    assert rejected[1]["reason"] == "subject should be a string, got ['MATH']"
+    assert rejected[2]["reason"] == "grade should be a string, got {'code': 'A'}"
@@ -0,0 +1,35 @@
+import asyncio
+
+import pytest
+
+from my_select import decode_cursor, encode_cursor, select_page
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor([3, "Lee"])
+    assert decode_cursor(cursor, 2) == [3, "Lee"]
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    encode_cursor([1])[:-3],
+    "e30=",  # {}
+    encode_cursor([[1, 2]]),
+])
+def test_decode_cursor_rejects_malformed_tokens(cursor):
+    with pytest.raises(ValueError, match="invalid cursor"):
+        decode_cursor(cursor, 1)
+
+
+def test_decode_cursor_rejects_wrong_number_of_values():
+    with pytest.raises(ValueError, match="invalid cursor"):
+        decode_cursor(encode_cursor([1, 2]), 1)
+
+
+def test_select_page_rejects_cursor_of_another_report():
+    # select_7 pages by two keys, a one value cursor fails before any query
+    with pytest.raises(ValueError, match="invalid cursor"):
+        asyncio.run(select_page(
+            "select_7", subject_name="MATH", group_code="X",
+            cursor=encode_cursor([1]),
+        ))